@@ -1,6 +1,18 @@
+import collections
+import functools
+import heapq
+import itertools
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
 import numpy as np
 import pandas as pd
-from scipy import stats
+from scipy import spatial, stats
 
 """
 Overview
@@ -60,6 +72,10 @@ To the extent that we utilize existing indicator data, we considered only datase
 ## Scoring, grouping, and weighting options ##
 ##############################################
 
+# The facility type lists below (and FACILITY_TYPE_SYNONYMS) are compiled into the scoring taxonomy once at
+# import. Change them at runtime with set_taxonomy or reload_taxonomy; editing the lists afterwards has no
+# effect. The remaining options are read each time requests are scored.
+
 # Set of facility types serving vulnerable or underserved populations
 VULN_FACILITIES = ['fqhc', # federally qualified health centers (and look-alikes)
                    'dsh', # medicaid disproportionate share hospital
@@ -95,42 +111,670 @@ VULN_WEIGHT = 1
 EXPOSURE_WEIGHT = 1
 CAPCITY_WEIGHT = 1
 
+# Local SVI comparison options
+RADIUS = 10 # radius in miles around each facility used to identify its local census tracts
+RADII = (5, 10, 25) # radii in miles compared by multi-radius vulnerability scoring
+SVI_COMPARISON = 'county' # compare local tract SVIs to the 'county' or 'region' SVI distribution
+COUNTIES_LIST = [] # counties making up the allocation region used when SVI_COMPARISON is 'region'
+
+##################
+## Request data ##
+##################
+
+# Points for how long current supply is predicted to last
+SUPPLY_POINTS = {"No supply remaining": 5, # critical need
+                 "2 days or less": 4, # dire need; future data will be "1–3 days"
+                 "1 week or less": 3, # urgent need; future data will be "4–7 days"
+                 "2 weeks or less": 2, # high need; future data will bee "1–2 weeks"
+                 "More than 2 weeks": 1} # moderate need
+
+# Surge multipliers based on PPE conservation practices
+SURGE_MULTIPLIERS = {"Conventional": 1,
+                     "Contingency": 10,
+                     "Crisis": 100}
+
+# Points for bed and ICU occupancy as a percentage of normal capacity. Occupancy data is optional.
+OCCUPANCY_POINTS = {"Under 100%": 0,
+                    "100-150%": 1,
+                    "151-200%": 2,
+                    "Over 200%": 3}
+
+# Compiled category tables. Code 0 is reserved for missing or unrecognized responses, so the lookup arrays
+# can be indexed directly with the int8 codes produced by encode_requests.
+SUPPLY_LEVELS = (None,) + tuple(SUPPLY_POINTS)
+SUPPLY_POINTS_TABLE = np.array([0] + list(SUPPLY_POINTS.values()), dtype=np.float32)
+
+SURGE_LEVELS = (None,) + tuple(SURGE_MULTIPLIERS)
+SURGE_MULTIPLIER_TABLE = np.array([1] + list(SURGE_MULTIPLIERS.values()), dtype=np.float32)
+
+# Unreported occupancy is NaN so it can be replaced with the regional median
+OCCUPANCY_LEVELS = (None,) + tuple(OCCUPANCY_POINTS)
+OCCUPANCY_POINTS_TABLE = np.array([np.nan] + list(OCCUPANCY_POINTS.values()), dtype=np.float32)
+
+CATEGORY_LEVELS = {"Current Supply": SUPPLY_LEVELS,
+                   "Item Surge Capacity": SURGE_LEVELS,
+                   "Bed Occupancy": OCCUPANCY_LEVELS,
+                   "ICU Occupancy": OCCUPANCY_LEVELS}
+
+# Request columns read by score_requests
+SCORING_COLUMNS = ["Current Supply",
+                   "Item Surge Capacity",
+                   "Facility Type",
+                   "COVID Patients",
+                   "ICU",
+                   "Aerosol Generating Procedures",
+                   "Bed Occupancy",
+                   "ICU Occupancy"]
+
+# Request columns holding the facility address, in the order of the facility_address tuples used by the GIS helpers
+ADDRESS_COLUMNS = ["Street", "City", "State", "Zip"]
+
+# Optional request columns holding facility coordinates in degrees, used instead of the address when present
+LOCATION_COLUMNS = ["Latitude", "Longitude"]
+
+def encode_categories(values, levels):
+    """
+    Return int8 category codes for an array of raw survey responses.
+
+    Parameters
+    ----------
+    values : array_like
+        Raw string responses
+
+    levels : tuple
+        Category levels, with the unrecognized level None at position 0
+
+    Returns
+    -------
+    codes : ndarray
+        int8 array with the position of each response in levels, or 0 if the response is not recognized
+    """
+    codes = pd.Categorical(values, categories=levels[1:]).codes
+    return (codes + 1).astype(np.int8)
+
+def category_codes(column, levels):
+    """
+    Return int8 category codes for a request column, encoding it first if it still holds raw responses.
+    """
+    if column.dtype == np.int8:
+        return column.to_numpy()
+    return encode_categories(column, levels)
+
+def request_codes(dat, column):
+    """
+    Return int8 category codes for a request column, or all zeros (not reported) if the column is absent.
+    """
+    if column not in dat:
+        return np.zeros(len(dat), dtype=np.int8)
+    return category_codes(dat[column], CATEGORY_LEVELS[column])
+
+def request_flags(dat, column):
+    """
+    Return a boolean array for a yes/no request column, treating missing values (or a missing column) as False.
+    """
+    if column not in dat:
+        return np.zeros(len(dat), dtype=bool)
+    return dat[column].eq(True).to_numpy()
+
+# Free-text synonyms for each facility type code, in addition to the code itself
+FACILITY_TYPE_SYNONYMS = {'fqhc': ['federally qualified health center', 'fqhc look alike'],
+                          'dsh': ['disproportionate share hospital'],
+                          'rhc': ['rural health clinic'],
+                          'cah': ['critical access hospital'],
+                          'indian_tribal': ['indian health service', 'ihs', 'tribal health', 'tribal clinic'],
+                          'chc': ['community health center', 'community health clinic'],
+                          'hs': ['homeless shelter'],
+                          'cf_dt': ['correctional facility', 'detention center', 'jail', 'prison'],
+                          'ach': ['acute care hospital'],
+                          'fs_er': ['freestanding emergency room', 'freestanding er', 'free standing er',
+                                    'freestanding emergency department'],
+                          'fh': ['field hospital'],
+                          'hof': ['hospital overflow facility', 'overflow facility'],
+                          'ems': ['emergency medical services', 'fire department', 'paramedic', 'ambulance'],
+                          'nach': ['non acute care hospital'],
+                          'rp': ['residential psychiatric', 'inpatient psychiatric', 'psychiatric facility'],
+                          'ir': ['inpatient rehabilitation', 'rehabilitation facility'],
+                          'rs': ['residential substance treatment', 'substance treatment center'],
+                          'nh_sn_al': ['nursing home', 'skilled nursing', 'assisted living'],
+                          'ltc': ['long term care'],
+                          'gh': ['group home']}
+
+def tokenize_facility_type(text):
+    """
+    Return the list of normalized word tokens in a facility type description.
+
+    Text is lowercased and split on anything other than letters, digits and underscores, and a trailing
+    plural 's' is dropped from longer words so that e.g. "Nursing Homes" matches "nursing home".
+    """
+    return [token[:-1] if len(token) > 3 and token.endswith('s') else token
+            for token in re.findall(r'[a-z0-9_]+', text.lower())]
+
+def compile_facility_matcher(synonyms):
+    """
+    Compile facility type codes and their synonyms into a token trie.
+
+    Parameters
+    ----------
+    synonyms : dict
+        Dictionary mapping each facility type code to a list of synonym phrases
+
+    Returns
+    -------
+    matcher : dict
+        Nested dictionary keyed by token. The facility type code for a complete phrase is stored under the
+        key None.
+    """
+    matcher = {}
+    for facility_type, phrases in synonyms.items():
+        for phrase in [facility_type] + list(phrases):
+            node = matcher
+            for token in tokenize_facility_type(phrase):
+                node = node.setdefault(token, {})
+            node[None] = facility_type
+    return matcher
+
+FACILITY_TYPE_MATCHER = compile_facility_matcher(FACILITY_TYPE_SYNONYMS)
+
+def match_facility_types(tokens, matcher):
+    """
+    Return the set of facility type codes found in a list of tokens.
+
+    Matching scans the tokens once from left to right, taking the longest phrase in the matcher starting at
+    each position, so "non acute care hospital" matches 'nach' rather than 'ach'.
+    """
+    found = set()
+    start = 0
+    while start < len(tokens):
+        node = matcher
+        match, match_end = None, start + 1
+        for end in range(start, len(tokens)):
+            node = node.get(tokens[end])
+            if node is None:
+                break
+            if None in node:
+                match, match_end = node[None], end + 1
+        if match is not None:
+            found.add(match)
+        start = match_end
+    return found
+
+class FacilityTaxonomy:
+    """
+    Facility type codes, their synonyms and the vulnerable and group facility lists, compiled into the type
+    bitmasks and matcher used for scoring.
+
+    Parameters
+    ----------
+    synonyms : dict
+        Dictionary mapping each facility type code to a list of free-text synonyms
+
+    vuln_facilities, group_1_facilities, group_2_facilities : list
+        Facility type codes serving vulnerable populations and making up each allocation group, see
+        VULN_FACILITIES, GROUP_1_FACILITIES and GROUP_2_FACILITEIS
+
+    previous : FacilityTaxonomy, optional
+        Taxonomy being replaced. Codes it already defines keep the same bit, so existing type masks stay
+        comparable and only facilities whose types changed need rescoring.
+    """
+
+    MAX_FACILITY_TYPES = 63
+
+    def __init__(self, synonyms, vuln_facilities, group_1_facilities, group_2_facilities, previous=None):
+        self.synonyms = {facility_type: tuple(phrases) for facility_type, phrases in synonyms.items()}
+        for facility_type in list(vuln_facilities) + list(group_1_facilities) + list(group_2_facilities):
+            self.synonyms.setdefault(facility_type, ())
+
+        # Bits of removed codes are never reused, so a mask always means the same thing across reloads
+        self.bits = {}
+        self._next_bit = 0 if previous is None else previous._next_bit
+        for facility_type in self.synonyms:
+            if previous is not None and facility_type in previous.bits:
+                self.bits[facility_type] = previous.bits[facility_type]
+            else:
+                self.bits[facility_type] = 1 << self._next_bit
+                self._next_bit += 1
+        if self._next_bit > self.MAX_FACILITY_TYPES:
+            raise ValueError("Facility taxonomy has assigned more than %d facility type bits; build it without "
+                             "previous to renumber" % self.MAX_FACILITY_TYPES)
+
+        self.facility_types = tuple(self.synonyms)
+        self.vuln_facilities = tuple(vuln_facilities)
+        self.group_1_facilities = tuple(group_1_facilities)
+        self.group_2_facilities = tuple(group_2_facilities)
+        self.vuln_mask = self.type_mask(vuln_facilities)
+        self.group_1_mask = self.type_mask(group_1_facilities)
+        self.group_2_mask = self.type_mask(group_2_facilities)
+        self.matcher = compile_facility_matcher(self.synonyms)
+        self.parse = functools.lru_cache(maxsize=65536)(self._parse)
+
+    def __getstate__(self):
+        # The parse cache is per process; drop it so taxonomies can be sent to worker processes
+        state = self.__dict__.copy()
+        del state['parse']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.parse = functools.lru_cache(maxsize=65536)(self._parse)
+
+    def type_mask(self, facility_types):
+        """
+        Return the bitmask for a collection of facility type codes, ignoring unknown codes.
+        """
+        mask = 0
+        for facility_type in facility_types:
+            mask |= self.bits.get(facility_type, 0)
+        return mask
+
+    def _parse(self, facility_type):
+        if not isinstance(facility_type, str):
+            return 0
+        return self.type_mask(match_facility_types(tokenize_facility_type(facility_type), self.matcher))
+
+    def encode(self, values):
+        """
+        Return an int64 facility type mask for each facility type string in values.
+
+        Each distinct string is parsed once, so encoding cost depends on the number of distinct self-reports
+        rather than the number of requests.
+        """
+        codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+        masks = np.array([self.parse(facility_type) for facility_type in uniques], dtype=np.int64)
+        return masks[codes]
+
+    def extends(self, previous):
+        """
+        Return whether this taxonomy numbers its facility types consistently with previous, i.e. as if it had
+        been built with previous=previous.
+        """
+        first_new_bit = 1 << previous._next_bit
+        return all(previous.bits[facility_type] == bit if facility_type in previous.bits
+                   else bit >= first_new_bit for facility_type, bit in self.bits.items())
+
+    def renumbered(self, previous):
+        """
+        Return a copy of this taxonomy with its facility types numbered consistently with previous.
+        """
+        return FacilityTaxonomy(self.synonyms, self.vuln_facilities, self.group_1_facilities,
+                                self.group_2_facilities, previous=previous)
+
+    def changes(self, other):
+        """
+        Return the bitmask of facility types that were added, removed, or changed synonyms, vulnerability
+        or group membership between other and this taxonomy.
+
+        Masks are compared bit by bit, so this taxonomy must extend other (see extends).
+        """
+        changed = self.vuln_mask ^ other.vuln_mask
+        changed |= self.group_1_mask ^ other.group_1_mask
+        changed |= self.group_2_mask ^ other.group_2_mask
+        for facility_type in set(self.bits) | set(other.bits):
+            if self.synonyms.get(facility_type) != other.synonyms.get(facility_type):
+                changed |= self.bits.get(facility_type, 0) | other.bits.get(facility_type, 0)
+        return changed
+
+def load_taxonomy(path, previous=None):
+    """
+    Load a facility taxonomy from a JSON config file.
+
+    Parameters
+    ----------
+    path : str
+        Path to a JSON file of the form {"facility_types": {code: [synonym, ...], ...}, "vuln_facilities":
+        [code, ...], "group_1_facilities": [code, ...], "group_2_facilities": [code, ...]}
+
+    previous : FacilityTaxonomy, optional
+        Taxonomy being replaced, see FacilityTaxonomy
+
+    Returns
+    -------
+    taxonomy : FacilityTaxonomy
+        Compiled taxonomy
+    """
+    with open(path) as f:
+        config = json.load(f)
+    return FacilityTaxonomy(config.get("facility_types", {}),
+                            config.get("vuln_facilities", []),
+                            config.get("group_1_facilities", []),
+                            config.get("group_2_facilities", []),
+                            previous=previous)
+
+_TAXONOMY = FacilityTaxonomy(FACILITY_TYPE_SYNONYMS, VULN_FACILITIES, GROUP_1_FACILITIES, GROUP_2_FACILITEIS)
+_TAXONOMY_LOCK = threading.RLock()
+
+def get_taxonomy():
+    """
+    Return the facility taxonomy currently used for scoring.
+    """
+    return _TAXONOMY
+
+def set_taxonomy(taxonomy):
+    """
+    Atomically replace the facility taxonomy used for scoring.
+
+    If taxonomy was not built with previous set to the current taxonomy, a renumbered copy is installed
+    instead so that type masks keep their meaning and the returned change mask is correct. Once reloads have
+    used up every facility type bit, the taxonomy is numbered afresh and every facility needs rescoring.
+
+    Returns
+    -------
+    changed : int
+        Bitmask of the facility types affected by the change, see FacilityTaxonomy.changes, or -1 (all bits
+        set) if the taxonomy was numbered afresh. Only facilities whose type mask intersects it need
+        rescoring.
+    """
+    global _TAXONOMY
+    with _TAXONOMY_LOCK:
+        previous = _TAXONOMY
+        if not taxonomy.extends(previous):
+            try:
+                taxonomy = taxonomy.renumbered(previous)
+            except ValueError: # out of facility type bits
+                _TAXONOMY = taxonomy.renumbered(None)
+                return -1
+        _TAXONOMY = taxonomy
+    return taxonomy.changes(previous)
+
+def reload_taxonomy(path):
+    """
+    Load a facility taxonomy config file and swap it in for scoring, see load_taxonomy and set_taxonomy.
+
+    Request frames encoded with encode_requests hold type masks parsed with the old taxonomy and should be
+    re-encoded from the raw "Facility Type" column after a reload.
+    """
+    return set_taxonomy(load_taxonomy(path))
+
+def parse_facility_type(facility_type):
+    """
+    Return the type mask for a free-text facility type description.
+
+    Parameters
+    ----------
+    facility_type : str
+        Self-reported facility type, listing facility type codes and/or their synonyms
+
+    Returns
+    -------
+    mask : int
+        Bitmask of the facility type codes found in facility_type, using the current taxonomy
+    """
+    return get_taxonomy().parse(facility_type)
+
+def facility_masks(dat, taxonomy=None):
+    """
+    Return the int64 facility type masks for dat, encoding the "Facility Type" column first if needed.
+    """
+    if "Facility Type" not in dat:
+        return np.zeros(len(dat), dtype=np.int64)
+    column = dat["Facility Type"]
+    if column.dtype == np.int64:
+        return column.to_numpy()
+    return (taxonomy or get_taxonomy()).encode(column)
+
+_POPCOUNT_TABLE = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+def popcount(masks):
+    """
+    Return the number of set bits in each element of an int64 array.
+    """
+    masks = np.ascontiguousarray(masks, dtype=np.int64).view(np.uint64)
+    if hasattr(np, 'bitwise_count'): # numpy >= 2.0
+        return np.bitwise_count(masks)
+    return _POPCOUNT_TABLE[masks.view(np.uint8)].reshape(len(masks), 8).sum(axis=1)
+
+def in_facility_group(masks, group_mask):
+    """
+    Return a boolean array marking which facility type masks include any type in group_mask.
+    """
+    return (masks & group_mask) != 0
+
+def encode_requests(dat, taxonomy=None):
+    """
+    Return a copy of dat with categorical survey columns converted to int8 category codes and facility types
+    converted to int64 type masks.
+
+    Encoding once at ingest means repeated scoring runs index the compiled lookup tables directly instead
+    of comparing strings, and shrinks the memory footprint of the request frame.
+
+    Parameters
+    ----------
+    dat : DataFrame
+        Raw request data
+
+    taxonomy : FacilityTaxonomy, optional
+        Taxonomy used to parse facility types. Defaults to the current taxonomy.
+
+    Returns
+    -------
+    encoded : DataFrame
+        Request data with each column in CATEGORY_LEVELS replaced by its int8 codes and "Facility Type"
+        replaced by its type masks
+    """
+    encoded = dat.copy()
+    for column, levels in CATEGORY_LEVELS.items():
+        if column in encoded:
+            encoded[column] = category_codes(encoded[column], levels)
+    if "Facility Type" in encoded:
+        encoded["Facility Type"] = facility_masks(encoded, taxonomy)
+    return encoded
+
 ###################
 ## Urgency score ##
 ###################
 
-urgency_score = 0
-
-# Assign base urgency points based on how long current supply is predicted to last.
-if dat.loc[row_idx,"Current Supply"] is "No supply remaining": # critical need
-    urgency_score += 5
-elif dat.loc[row_idx,"Current Supply"] is "2 days or less": # dire need; future data will be "1–3 days"
-    urgency_score += 4
-elif dat.loc[row_idx,"Current Supply"] is "1 week or less": # urgent need; future data will be "4–7 days"
-    urgency_score += 3
-elif dat.loc[row_idx,"Current Supply"] is "2 weeks or less": # high need; future data will bee "1–2 weeks"
-    urgency_score += 2
-elif dat.loc[row_idx,"Current Supply"] is "More than 2 weeks": # moderate need
-    urgency_score += 1
-
-# Assign Surge Points based on PPE conservation practices
-if dat.loc[row_idx,"Item Surge Capacity"] is "Conventional": 
-    need_score *= 1
-elif dat.loc[row_idx,"Item Surge Capacity"] is "Contingency": 
-    need_score *= 10
-elif dat.loc[row_idx,"Item Surge Capacity"] is "Crisis":
-    need_score *= 100
+def urgency_points(dat, out=None):
+    """
+    Return the urgency points for every request in dat as an array, optionally writing them into out.
+
+    Unrecognized or unreported supply levels score 0 and unrecognized surge capacities are treated as
+    conventional.
+    """
+    supply = request_codes(dat, "Current Supply")
+    surge = request_codes(dat, "Item Surge Capacity")
+    return np.multiply(SUPPLY_POINTS_TABLE[supply], SURGE_MULTIPLIER_TABLE[surge], out=out)
+
+def score_urgency(dat):
+    """
+    Return the urgency score for every request in dat.
+
+    Parameters
+    ----------
+    dat : DataFrame
+        Request data containing "Current Supply" and "Item Surge Capacity" columns, either raw or encoded
+        with encode_requests
+
+    Returns
+    -------
+    urgency : Series
+        Urgency score for each row of dat. Unrecognized supply levels score 0 and unrecognized surge
+        capacities are treated as conventional.
+    """
+    return pd.Series(urgency_points(dat), index=dat.index, name="urgency_score")
+
+def score_urgency_row(dat, row_idx):
+    """
+    Return the urgency score for a single request, see score_urgency.
+    """
+    return score_urgency(dat.loc[[row_idx]]).iloc[0]
+
+###############
+## Geocoding ##
+###############
+
+# Abbreviations applied to street names so that address variants share one cache entry and range lookup
+STREET_ABBREVIATIONS = {'STREET': 'ST', 'AVENUE': 'AVE', 'ROAD': 'RD', 'DRIVE': 'DR', 'BOULEVARD': 'BLVD',
+                        'LANE': 'LN', 'COURT': 'CT', 'PLACE': 'PL', 'HIGHWAY': 'HWY', 'PARKWAY': 'PKWY',
+                        'CIRCLE': 'CIR', 'TERRACE': 'TER', 'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+                        'SUITE': 'STE'}
+
+def normalize_street(street):
+    """
+    Return a street name in upper case with punctuation removed and common words abbreviated.
+    """
+    words = re.sub(r'[^\w\s]', ' ', str(street).upper()).split()
+    return ' '.join(STREET_ABBREVIATIONS.get(word, word) for word in words)
+
+def address_part(part):
+    """
+    Return one part of a facility address as a string, with missing values as '' and whole numbers (such as
+    ZIP codes read into a float column) without a decimal point.
+    """
+    if pd.isna(part): # None, NaN, or pd.NA in nullable string columns
+        return ''
+    if isinstance(part, (float, np.floating)) and float(part).is_integer():
+        return str(int(part))
+    return str(part)
+
+def normalize_address(facility_address):
+    """
+    Return a normalized (street_name_and_number, city, state, zip) tuple for a facility address.
+
+    Streets and cities are normalized with normalize_street, states are upper-cased and ZIP codes are cut to
+    their first five digits.
+    """
+    street, city, state, zip_code = (address_part(part) for part in facility_address)
+    zip_code = re.sub(r'\D', '', zip_code)[:5].zfill(5) if re.search(r'\d', zip_code) else ''
+    return normalize_street(street), normalize_street(city), state.strip().upper(), zip_code
+
+def read_gazetteer(path, key_dtype=np.int64):
+    """
+    Return a DataFrame of INTPTLAT and INTPTLONG indexed by GEOID from a Census Bureau gazetteer file.
+    """
+    table = pd.read_csv(path, sep='\t', dtype={"GEOID": key_dtype})
+    table.columns = table.columns.str.strip() # the gazetteer pads its last column name
+    return table.set_index("GEOID")[["INTPTLAT", "INTPTLONG"]]
+
+class Geocoder:
+    """
+    Offline geocoder turning facility_address tuples into (latitude, longitude) coordinates.
+
+    Addresses are located by interpolating the house number along a matching street address range, falling
+    back to the centroid of the ZIP code. Results are kept in an in-memory LRU cache and, if cache_path is
+    given, a persistent on-disk cache, both keyed by the normalized address, so each distinct address is only
+    geocoded once.
+
+    Parameters
+    ----------
+    zip_centroids_path : str
+        Census Bureau ZCTA gazetteer file with GEOID, INTPTLAT and INTPTLONG columns
+
+    address_ranges_path : str, optional
+        csv file of street address ranges with zip, street, from_number, to_number, from_latitude,
+        from_longitude, to_latitude and to_longitude columns (e.g. derived from TIGER/Line address features)
+
+    cache_path : str, optional
+        sqlite database used as the persistent geocoding cache. Created if it does not exist.
+
+    cache_size : int
+        Maximum number of addresses held in the in-memory cache
+    """
+
+    def __init__(self, zip_centroids_path, address_ranges_path=None, cache_path=None, cache_size=100_000):
+        self.zip_centroids = read_gazetteer(zip_centroids_path, key_dtype=str)
+        self.zip_centroids.index = self.zip_centroids.index.str.zfill(5)
+
+        self.address_ranges = {}
+        if address_ranges_path is not None:
+            ranges = pd.read_csv(address_ranges_path, dtype={"zip": str})
+            ranges["zip"] = ranges["zip"].str.zfill(5)
+            ranges["street"] = ranges["street"].map(normalize_street)
+            columns = ["from_number", "to_number", "from_latitude", "from_longitude", "to_latitude", "to_longitude"]
+            for key, group in ranges.groupby(["zip", "street"]):
+                self.address_ranges[key] = group[columns].to_numpy(dtype=np.float64)
+
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if cache_path is not None:
+            self._db = sqlite3.connect(cache_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS geocodes "
+                             "(address TEXT PRIMARY KEY, latitude REAL, longitude REAL)")
+            self._db.commit()
+
+    def close(self):
+        """
+        Close the persistent cache.
+        """
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def geocode(self, facility_address):
+        """
+        Return the (latitude, longitude) of a facility_address tuple, or (nan, nan) if it cannot be located.
+        """
+        latitudes, longitudes = self.geocode_many([facility_address])
+        return float(latitudes[0]), float(longitudes[0])
+
+    def geocode_many(self, facility_addresses):
+        """
+        Return arrays of latitudes and longitudes for a sequence of facility_address tuples.
+
+        Newly geocoded addresses are written to the persistent cache in a single transaction per call.
+        """
+        addresses = [normalize_address(address) for address in facility_addresses]
+        with self._lock:
+            new_locations = []
+            locations = np.array([self._geocode_normalized(address, new_locations) for address in addresses],
+                                 dtype=np.float64)
+            self._store_persistent(new_locations)
+        locations = locations.reshape(-1, 2)
+        return locations[:, 0], locations[:, 1]
+
+    def _geocode_normalized(self, address, new_locations):
+        # Appends (address, location) to new_locations for addresses that are not yet in the persistent cache
+        if address in self._cache:
+            self._cache.move_to_end(address)
+            return self._cache[address]
+        location = self._lookup_persistent(address)
+        if location is None:
+            location = self._locate(*address)
+            new_locations.append((address, location))
+        self._cache[address] = location
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return location
+
+    def _locate(self, street, city, state, zip_code):
+        match = re.match(r'(\d+)\s+(.*)', street)
+        if match is not None and (zip_code, match.group(2)) in self.address_ranges:
+            number = float(match.group(1))
+            ranges = self.address_ranges[(zip_code, match.group(2))]
+            low = np.minimum(ranges[:, 0], ranges[:, 1])
+            high = np.maximum(ranges[:, 0], ranges[:, 1])
+            matching = np.flatnonzero((low <= number) & (number <= high))
+            if len(matching):
+                from_number, to_number, from_lat, from_lon, to_lat, to_lon = ranges[matching[0]]
+                fraction = (number - from_number) / (to_number - from_number) if to_number != from_number else 0.5
+                return (float(from_lat + fraction * (to_lat - from_lat)),
+                        float(from_lon + fraction * (to_lon - from_lon)))
+        if zip_code in self.zip_centroids.index:
+            centroid = self.zip_centroids.loc[zip_code]
+            return float(centroid["INTPTLAT"]), float(centroid["INTPTLONG"])
+        return np.nan, np.nan
+
+    def _lookup_persistent(self, address):
+        if self._db is None:
+            return None
+        row = self._db.execute("SELECT latitude, longitude FROM geocodes WHERE address = ?",
+                               ('|'.join(address),)).fetchone()
+        if row is None:
+            return None
+        return tuple(np.nan if value is None else value for value in row)
+
+    def _store_persistent(self, new_locations):
+        if self._db is None or not new_locations:
+            return
+        rows = [('|'.join(address), *(None if np.isnan(value) else float(value) for value in location))
+                for address, location in new_locations]
+        self._db.executemany("INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?)", rows)
+        self._db.commit()
 
 #########################
 ## Vulnerability score ##
 #########################
 
-vuln_score = 0
-
-for vuln_type in VULN_FACILITIES:
-    if vuln_type in facility_type:
-        vuln_score += 1
-
 # Vulnerability score based on local CDC SVI
 
 def get_radius_tracts(gis_data, facility_address, radius):
@@ -140,20 +784,51 @@ def get_radius_tracts(gis_data, facility_address, radius):
 
     Parameters
     ----------
-    gis_data : <unknown GIS type>
-        <data needed to do the fancy GIS stuff>
+    gis_data : dict
+        SVI and tract centroid arrays from load_svi_data, including the tract spatial index
 
     facility_address : tuple
-        Tuple of strings in the following format (street_name_and_number, city, state, zip)
+        Tuple of strings in the following format (street_name_and_number, city, state, zip), or a
+        (latitude, longitude) pair
 
     radius : float
-        Radius facility address to create a buffer for identifying local census tracts
+        Radius in miles around facility address to create a buffer for identifying local census tracts
 
     Returns
     -------
     tract_array : ndarray
-        1-dimensional array containing 11-digit FIPS codes for all census tracts within radius
+        1-dimensional int64 array containing 11-digit FIPS codes for all census tracts within radius
+    """
+    latitude, longitude = facility_coordinates(gis_data, facility_address)
+    return gis_data['fips'][query_radius_tracts(gis_data, latitude, longitude, radius)]
+
+def get_multi_radius_tracts(gis_data, facility_address, radii=None):
+    """
+    Return the 11-digit FIPS codes of the census tracts within each of several radii of facility_address.
+
+    Parameters
+    ----------
+    gis_data : dict
+        SVI and tract centroid arrays from load_svi_data, including the tract spatial index
+
+    facility_address : tuple
+        Tuple of strings in the following format (street_name_and_number, city, state, zip), or a
+        (latitude, longitude) pair
+
+    radii : sequence of float, optional
+        Radii in miles around facility address. Defaults to RADII.
+
+    Returns
+    -------
+    tract_arrays : dict
+        Maps each radius to an int64 array of the FIPS codes of the tracts within it, see
+        query_multi_radius_tracts
     """
+    if radii is None:
+        radii = RADII
+    latitude, longitude = facility_coordinates(gis_data, facility_address)
+    tracts = query_multi_radius_tracts(gis_data, latitude, longitude, radii)
+    return {radius: gis_data['fips'][positions] for radius, positions in tracts.items()}
 
 def get_county(gis_data, facility_address):
     """
@@ -161,18 +836,163 @@ def get_county(gis_data, facility_address):
 
     Parameters
     ----------
-    gis_data : <unknown GIS type>
-        <data needed to do the fancy GIS stuff>
+    gis_data : dict
+        County polygon arrays from load_county_polygons
 
     facility_address : tuple
-        Tuple of strings in the following format (street_name_and_number, city, state, zip)
+        Tuple of strings in the following format (street_name_and_number, city, state, zip), or a
+        (latitude, longitude) pair
+
+    Returns
+    -------
+    county_id : int
+        5-digit county FIPS code, or -1 if the facility is not inside any county
+    """
+    latitude, longitude = facility_coordinates(gis_data, facility_address)
+    return int(get_county_batch(gis_data, [latitude], [longitude])[0])
+
+def load_county_polygons(path, cell_size=0.5):
+    """
+    Load county boundaries from a GeoJSON file and build a uniform grid index over their bounding boxes.
+
+    Parameters
+    ----------
+    path : str
+        GeoJSON FeatureCollection of county Polygons/MultiPolygons with a 5-digit GEOID property, e.g. a
+        Census Bureau cartographic boundary file converted to GeoJSON
+
+    cell_size : float
+        Grid cell size in degrees
+
+    Returns
+    -------
+    county_data : dict
+        Dictionary of arrays: 'county_geoids', the edges of every county ring ('edge_x0', 'edge_y0', 'edge_x1',
+        'edge_y1', longitude/latitude in degrees) with 'county_edge_offsets' giving each county's slice,
+        'county_bounds' (N x 4 min longitude, min latitude, max longitude, max latitude), and the grid index
+        ('grid_origin', 'grid_cell_size', 'grid_shape', and 'grid_offsets'/'grid_counties' listing the counties
+        whose bounding box overlaps each cell). Merge it into svi_data to look up counties with get_county.
+    """
+    with open(path) as f:
+        features = json.load(f)["features"]
+
+    geoids = []
+    edges = []
+    edge_counts = []
+    for feature in features:
+        geometry = feature["geometry"]
+        polygons = geometry["coordinates"] if geometry["type"] == "MultiPolygon" else [geometry["coordinates"]]
+        rings = [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon]
+        county_edges = np.concatenate([np.column_stack([ring, np.roll(ring, -1, axis=0)]) for ring in rings])
+        geoids.append(int(feature["properties"]["GEOID"]))
+        edges.append(county_edges)
+        edge_counts.append(len(county_edges))
+    edges = np.concatenate(edges)
+
+    county_data = {'county_geoids': np.array(geoids, dtype=np.int64),
+                   'edge_x0': edges[:, 0], 'edge_y0': edges[:, 1], 'edge_x1': edges[:, 2], 'edge_y1': edges[:, 3],
+                   'county_edge_offsets': np.concatenate([[0], np.cumsum(edge_counts)]).astype(np.int64)}
+    starts = county_data['county_edge_offsets'][:-1]
+    bounds = np.column_stack([np.minimum.reduceat(edges[:, 0], starts), np.minimum.reduceat(edges[:, 1], starts),
+                              np.maximum.reduceat(edges[:, 0], starts), np.maximum.reduceat(edges[:, 1], starts)])
+    county_data['county_bounds'] = bounds
+
+    # Grid index: each cell lists the counties whose bounding box overlaps it
+    origin = bounds[:, :2].min(axis=0)
+    shape = (np.floor((bounds[:, 2:].max(axis=0) - origin) / cell_size).astype(np.int64) + 1)
+    low_cells = np.floor((bounds[:, :2] - origin) / cell_size).astype(np.int64)
+    high_cells = np.floor((bounds[:, 2:] - origin) / cell_size).astype(np.int64)
+    cells = []
+    cell_counties = []
+    for county, (low, high) in enumerate(zip(low_cells, high_cells)):
+        x_cells, y_cells = np.meshgrid(np.arange(low[0], high[0] + 1), np.arange(low[1], high[1] + 1))
+        cells.append((x_cells * shape[1] + y_cells).ravel())
+        cell_counties.append(np.full(x_cells.size, county))
+    cells = np.concatenate(cells)
+    cell_counties = np.concatenate(cell_counties)
+    order = np.lexsort((cell_counties, cells))
+    county_data['grid_origin'] = origin
+    county_data['grid_cell_size'] = np.array(cell_size, dtype=np.float64)
+    county_data['grid_shape'] = shape
+    county_data['grid_counties'] = cell_counties[order]
+    county_data['grid_offsets'] = np.searchsorted(cells[order], np.arange(shape[0] * shape[1] + 1))
+    return county_data
+
+def get_county_batch(gis_data, latitudes, longitudes, max_edges=2_000_000):
+    """
+    Return the county containing each of an array of facility locations.
+
+    Candidate counties are taken from the grid cell containing each point and filtered by bounding box, then
+    an even-odd ray crossing test is run over the edges of the candidates only, vectorized over all
+    (point, candidate) pairs.
+
+    Parameters
+    ----------
+    gis_data : dict
+        County polygon arrays from load_county_polygons
+
+    latitudes, longitudes : array_like
+        Facility coordinates in degrees
+
+    max_edges : int
+        Maximum number of (point, edge) tests evaluated at once, bounding memory use
 
     Returns
     -------
-    county_id : <unknown GIS type>
-        <Unique GIS county id>
+    counties : ndarray
+        int64 5-digit county FIPS code for each location, or -1 where no county contains it
     """
+    y = np.asarray(latitudes, dtype=np.float64)
+    x = np.asarray(longitudes, dtype=np.float64)
+    counties = np.full(len(x), -1, dtype=np.int64)
+
+    # Candidate (point, county) pairs from the grid cell of each point
+    shape = gis_data['grid_shape']
+    with np.errstate(invalid='ignore'):
+        cell_x = np.floor((x - gis_data['grid_origin'][0]) / gis_data['grid_cell_size'])
+        cell_y = np.floor((y - gis_data['grid_origin'][1]) / gis_data['grid_cell_size'])
+        in_grid = (cell_x >= 0) & (cell_x < shape[0]) & (cell_y >= 0) & (cell_y < shape[1])
+    points = np.flatnonzero(in_grid)
+    cells = cell_x[in_grid].astype(np.int64) * shape[1] + cell_y[in_grid].astype(np.int64)
+    starts = gis_data['grid_offsets'][cells]
+    lengths = gis_data['grid_offsets'][cells + 1] - starts
+    pair_points = np.repeat(points, lengths)
+    pair_counties = gis_data['grid_counties'][slice_positions(starts, lengths)]
+    bounds = gis_data['county_bounds'][pair_counties]
+    px, py = x[pair_points], y[pair_points]
+    in_bounds = (bounds[:, 0] <= px) & (px <= bounds[:, 2]) & (bounds[:, 1] <= py) & (py <= bounds[:, 3])
+    pair_points, pair_counties = pair_points[in_bounds], pair_counties[in_bounds]
 
+    # Ray crossing test over the candidate edges, a chunk of pairs at a time
+    edge_offsets = gis_data['county_edge_offsets']
+    pair_edge_counts = edge_offsets[pair_counties + 1] - edge_offsets[pair_counties]
+    cumulative_edges = np.cumsum(pair_edge_counts)
+    chunk_start = 0
+    while chunk_start < len(pair_points):
+        chunk_limit = cumulative_edges[chunk_start] - pair_edge_counts[chunk_start] + max_edges
+        chunk_end = max(np.searchsorted(cumulative_edges, chunk_limit, side='right'), chunk_start + 1)
+        chunk_points = pair_points[chunk_start:chunk_end]
+        chunk_counties = pair_counties[chunk_start:chunk_end]
+        lengths = pair_edge_counts[chunk_start:chunk_end]
+        chunk_start = chunk_end
+
+        edge_pair = np.repeat(np.arange(len(chunk_points)), lengths)
+        edges = slice_positions(edge_offsets[chunk_counties], lengths)
+        ex0, ey0 = gis_data['edge_x0'][edges], gis_data['edge_y0'][edges]
+        ex1, ey1 = gis_data['edge_x1'][edges], gis_data['edge_y1'][edges]
+        ex, ey = x[chunk_points][edge_pair], y[chunk_points][edge_pair]
+        straddles = (ey0 > ey) != (ey1 > ey)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_x = ex0 + (ey - ey0) * (ex1 - ex0) / (ey1 - ey0)
+        crossings = np.bincount(edge_pair, weights=straddles & (ex < crossing_x), minlength=len(chunk_points))
+        inside = crossings % 2 == 1
+
+        # Assign each point the first county containing it
+        hit_points, hit_counties = chunk_points[inside], chunk_counties[inside]
+        unassigned = counties[hit_points] == -1
+        assigned_points, first = np.unique(hit_points[unassigned], return_index=True)
+        counties[assigned_points] = gis_data['county_geoids'][hit_counties[unassigned][first]]
+    return counties
 
 def get_county_tracts(gis_data, counties_list):
     """
@@ -180,84 +1000,1483 @@ def get_county_tracts(gis_data, counties_list):
 
     Parameters
     ----------
-    gis_data : <unknown GIS type>
-        <data needed to do the fancy GIS stuff>
- 
+    gis_data : dict
+        SVI arrays from load_svi_data, including the county index
 
     counties_array : list
-        A list of <GIS unique county identifiers>
+        A list of 5-digit county FIPS codes, as integers or strings
 
     Returns
     -------
     tract_array : ndarray
-        1-dimensional array containing 11-digit FIPS codes for all census tracts within counties_list.
+        1-dimensional int64 array containing 11-digit FIPS codes for all census tracts within counties_list.
+    """
+    return gis_data['fips'][county_tract_indices(gis_data, counties_list)]
+
+def build_county_index(svi_data):
     """
+    Build the county index used to find the tracts in a county and store it in svi_data.
 
-local_svis = get_radius_svis(svi_data, facility_address, RADIUS)
+    Tracts are stored in FIPS order, and a tract FIPS code begins with its 5-digit county FIPS code, so the
+    tracts of each county form one contiguous slice. The index records where each county's slice starts.
 
-# Local SVI extrema counts (relative to county and region)
-regional_svis = get_regional_svis(svi_data, COUNTIES_LIST)
-county = get_county(facility_address)
-county_svis = get_county_svis(svi_data, county)
-regional_top_quartile_count = np.sum(local_svis >= stats.scoreatpercentile(regional_svis, 75)) 
-county_top_quartile_count = np.sum(local_svis >= stats.scoreatpercentile(county_svis, 75)) 
+    Parameters
+    ----------
+    svi_data : dict
+        SVI arrays ordered by tract FIPS code, see load_svi_data
 
-if SVI_COMPARISON is 'region':
-    vuln_score += regional_top_quartile_count 
-elif SVI_COMPARISON is 'county':
-    vuln_score += county_top_quartile_count
+    Returns
+    -------
+    svi_data : dict
+        svi_data with 'counties' (sorted int64 county FIPS codes) and 'county_offsets' added. The tracts in
+        counties[i] are at positions county_offsets[i]:county_offsets[i + 1].
+    """
+    counties, starts = np.unique(svi_data['fips'] // 1_000_000, return_index=True)
+    svi_data['counties'] = counties
+    svi_data['county_offsets'] = np.append(starts, len(svi_data['fips'])).astype(np.int64)
+    return svi_data
 
-vuln_score = vuln_score * VULN_WEIGHT
+def county_tract_indices(svi_data, counties_list):
+    """
+    Return the positions in svi_data of all census tracts within a list of 5-digit county FIPS codes.
+    """
+    counties = np.unique(fips_codes(counties_list))
+    county_index = np.searchsorted(svi_data['counties'], counties)
+    found = county_index < len(svi_data['counties'])
+    found[found] = svi_data['counties'][county_index[found]] == counties[found]
+    county_index = county_index[found]
 
-####################
-## Exposure score ##
-####################
+    starts = svi_data['county_offsets'][county_index]
+    return slice_positions(starts, svi_data['county_offsets'][county_index + 1] - starts)
+
+def slice_positions(starts, lengths):
+    """
+    Return the concatenated positions of several contiguous slices, given their starts and lengths, without
+    a Python loop.
+    """
+    slice_offsets = np.cumsum(lengths) - lengths
+    return np.arange(lengths.sum()) + np.repeat(starts - slice_offsets, lengths)
+
+def load_svi_data(path, centroids_path=None):
+    """
+    Load census tract SVIs from a CDC SVI csv file.
 
-exposure_score = 0
+    Parameters
+    ----------
+    path : str
+        Path to a CDC/ATSDR SVI csv file with FIPS and RPL_THEMES columns
 
-if has_covid is True:
-    exposure_score += 10
+    centroids_path : str, optional
+        Path to a Census Bureau tract gazetteer file with GEOID, INTPTLAT and INTPTLONG columns. Tract
+        centroids are needed for radius queries.
 
-if has_icu is True:
-    exposure_score += 6
+    Returns
+    -------
+    svi_data : dict
+        Dictionary of 1-dimensional arrays ordered by tract FIPS code: 'fips' (int64 11-digit tract FIPS codes)
+        and 'svi' (overall SVI percentile ranking, NaN where the CDC reports no value), a 'version' number
+        identifying this load, the county index (see build_county_index), the 75th percentile SVI of each
+        county in 'county_thresholds' (see county_svi_thresholds) and the top quartile flags of each tract
+        (see build_extrema_flags). If centroids_path is given, also 'latitude' and 'longitude' of each tract
+        centroid and the tract spatial index, see build_tract_index. Store a Geocoder under 'geocoder' to
+        look up facilities by street address.
+    """
+    table = pd.read_csv(path, usecols=["FIPS", "RPL_THEMES"], dtype={"FIPS": np.int64, "RPL_THEMES": np.float64})
+    table = table.sort_values("FIPS")
+    svi = table["RPL_THEMES"].to_numpy(copy=True)
+    svi[svi < 0] = np.nan # -999 marks tracts without an SVI
+    svi_data = {'fips': table["FIPS"].to_numpy(), 'svi': svi, 'version': np.array(next(_SVI_VERSIONS))}
+    build_county_index(svi_data)
+    svi_data['county_thresholds'] = county_svi_thresholds(svi_data)
+    clear_threshold_cache()
+    build_extrema_flags(svi_data)
 
-# Aerosol generating procedures but is not an ICU (e.g. freestanding ERs, paramedics)
-if aerosols is True and has_icu is False:
-    exposure_score += 3
+    if centroids_path is not None:
+        centroids = read_gazetteer(centroids_path).reindex(svi_data['fips'])
+        svi_data['latitude'] = centroids["INTPTLAT"].to_numpy(dtype=np.float64)
+        svi_data['longitude'] = centroids["INTPTLONG"].to_numpy(dtype=np.float64)
+        build_tract_index(svi_data)
+    return svi_data
 
-exposure_score = exposure_score * EXPOSURE_WEIGHT
+SVI_STORE_FORMAT = 1
 
-####################
-## Capacity score ##
-####################
+def compile_svi_store(svi_data, directory):
+    """
+    Write SVI data and its indexes to a directory in a compiled on-disk format for open_svi_store.
 
-capacity_score = 0
+    Every array in svi_data (tract FIPS codes, SVIs, centroids, county offsets and thresholds, extrema flags,
+    and any merged county polygon arrays) is written as a flat .npy file, so nothing needs to be parsed when
+    the store is opened.
 
-# Occupancy data is optional. 
+    Parameters
+    ----------
+    svi_data : dict
+        SVI arrays from load_svi_data
 
-if bed_occupancy is 100_150:    
-    capacity_score += 1
-elif bed_occupancy is 151_200:
-    capacity_score += 2
-elif bed_occupancy is over_200:
-    capacity_score += 3
-elif bed_occupancy is not_reported:
-    capacity_score += regional_median_bed_occupancy_points
+    directory : str
+        Directory to write the store to. Created if it does not exist.
+    """
+    os.makedirs(directory, exist_ok=True)
+    arrays = [name for name, value in svi_data.items() if isinstance(value, np.ndarray) and name != 'version']
+    for name in arrays:
+        np.save(os.path.join(directory, name + '.npy'), svi_data[name], allow_pickle=False)
+    with open(os.path.join(directory, 'store.json'), 'w') as f:
+        json.dump({'format': SVI_STORE_FORMAT, 'arrays': arrays, 'tree': 'tree' in svi_data}, f)
 
-if has_icu:
-    if icu_occupancy is 100_150:    
-        capacity_score += 1
-    elif icu_occupancy is 151_200:
-        capacity_score += 2
-    elif icu_occupancy is over_200:
-        capacity_score += 3
-    elif icu_occupancy is not_reported:
-        capacity_score += regional_median_icu_occupancy_points
+def open_svi_store(directory):
+    """
+    Open SVI data written by compile_svi_store.
 
-capacity_score = capacity_score * CAPACITY_WEIGHT
+    Arrays are memory-mapped read-only rather than read into memory, so opening a store is nearly instant and
+    processes opening the same store share its pages through the operating system's page cache. The tract
+    spatial index is rebuilt over the memory-mapped tract_xyz, which takes milliseconds and shares its point
+    data with the store; only the tree nodes are private to each process.
 
-##########################
-## Total Priority Score ##
-##########################
+    Parameters
+    ----------
+    directory : str
+        Directory written by compile_svi_store
+
+    Returns
+    -------
+    svi_data : dict
+        SVI arrays as returned by load_svi_data, backed by the files in directory
+    """
+    with open(os.path.join(directory, 'store.json')) as f:
+        manifest = json.load(f)
+    if manifest['format'] != SVI_STORE_FORMAT:
+        raise ValueError("Unsupported SVI store format %r in %s" % (manifest['format'], directory))
+
+    svi_data = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r', allow_pickle=False)
+                for name in manifest['arrays']}
+    if manifest['tree']:
+        svi_data['tree'] = spatial.cKDTree(svi_data['tract_xyz'])
+    svi_data['version'] = np.array(next(_SVI_VERSIONS))
+    clear_threshold_cache()
+    clear_neighborhood_cache()
+    return svi_data
+
+EARTH_RADIUS = 3958.8 # mean earth radius in miles
+
+def unit_sphere_coordinates(latitude, longitude):
+    """
+    Return an N x 3 array of 3D coordinates on the unit sphere for arrays of latitudes and longitudes in degrees.
+    """
+    latitude = np.radians(latitude)
+    longitude = np.radians(longitude)
+    return np.column_stack([np.cos(latitude) * np.cos(longitude),
+                            np.cos(latitude) * np.sin(longitude),
+                            np.sin(latitude)])
+
+def chord_length(radius):
+    """
+    Return the unit-sphere chord length spanning a great-circle distance of radius miles.
+    """
+    return 2 * np.sin(np.minimum(np.asarray(radius) / EARTH_RADIUS, np.pi) / 2)
+
+def build_tract_index(svi_data):
+    """
+    Build the spatial index over tract centroids used by radius queries and store it in svi_data.
+
+    Centroids are indexed as 3D points on the unit sphere, where straight-line chord distance increases
+    monotonically with great-circle distance, so a radius query is a single KD-tree ball query. Tracts
+    without a centroid are left out of the index.
+
+    Parameters
+    ----------
+    svi_data : dict
+        SVI arrays with 'latitude' and 'longitude', see load_svi_data
+
+    Returns
+    -------
+    svi_data : dict
+        svi_data with 'tract_xyz' (unit-sphere centroid coordinates), 'indexed_tracts' (positions of the
+        tracts in the index) and 'tree' (scipy.spatial.cKDTree over tract_xyz) added
+    """
+    located = np.flatnonzero(~np.isnan(svi_data['latitude']) & ~np.isnan(svi_data['longitude']))
+    svi_data['tract_xyz'] = unit_sphere_coordinates(svi_data['latitude'][located], svi_data['longitude'][located])
+    svi_data['indexed_tracts'] = located
+    svi_data['tree'] = spatial.cKDTree(svi_data['tract_xyz'])
+    clear_neighborhood_cache()
+    return svi_data
+
+def query_radius_tracts(svi_data, latitude, longitude, radius):
+    """
+    Return the sorted positions in svi_data of all census tracts with a centroid within radius miles of a point.
+    """
+    if np.isnan(latitude) or np.isnan(longitude):
+        return np.array([], dtype=np.int64)
+    point = unit_sphere_coordinates([latitude], [longitude])[0]
+    hits = svi_data['tree'].query_ball_point(point, chord_length(radius))
+    return np.sort(svi_data['indexed_tracts'][hits])
+
+NEIGHBORHOOD_CACHE_SIZE = 100_000 # facility locations whose multi-radius tract sets are kept in memory
+_NEIGHBORHOOD_CACHE = collections.OrderedDict() # (SVI data version, latitude, longitude, radii) -> tract sets
+_NEIGHBORHOOD_LOCK = threading.Lock()
+
+def clear_neighborhood_cache():
+    """
+    Discard all cached multi-radius tract sets. Called whenever the tract index is (re)built or loaded.
+    """
+    with _NEIGHBORHOOD_LOCK:
+        _NEIGHBORHOOD_CACHE.clear()
+
+def _cached_tract_sets(keys):
+    # Return the cached tract sets for each key, or None where a key is not cached
+    with _NEIGHBORHOOD_LOCK:
+        tract_sets = [_NEIGHBORHOOD_CACHE.get(key) for key in keys]
+        for key, tracts in zip(keys, tract_sets):
+            if tracts is not None:
+                _NEIGHBORHOOD_CACHE.move_to_end(key)
+    return tract_sets
+
+def _cache_tract_sets(keys, tract_sets):
+    with _NEIGHBORHOOD_LOCK:
+        for key, tracts in zip(keys, tract_sets):
+            _NEIGHBORHOOD_CACHE[key] = tracts
+        while len(_NEIGHBORHOOD_CACHE) > NEIGHBORHOOD_CACHE_SIZE:
+            _NEIGHBORHOOD_CACHE.popitem(last=False)
+
+def query_multi_radius_tracts(svi_data, latitude, longitude, radii):
+    """
+    Return the census tracts within each of several radii of a point, from a single traversal of the tract index.
+
+    One ball query is made at the largest radius, and the tracts within each smaller radius are picked out of
+    its hits by their chord distance to the point. Results are cached per (SVI data version, location, radii),
+    so scoring a facility at several radii, or scoring it again, costs about as much as a single radius query.
+
+    Parameters
+    ----------
+    svi_data : dict
+        SVI and tract centroid arrays from load_svi_data, including the tract spatial index
+
+    latitude, longitude : float
+        Facility coordinates in degrees
+
+    radii : sequence of float
+        Radii in miles around the facility
+
+    Returns
+    -------
+    tracts : dict
+        Maps each radius to the sorted positions in svi_data of the tracts within it, as read-only arrays
+        shared with the cache
+    """
+    radii = tuple(float(radius) for radius in radii)
+    latitude, longitude = float(latitude), float(longitude)
+    key = (int(svi_data['version']), latitude, longitude, radii)
+    cached, = _cached_tract_sets([key])
+    if cached is not None:
+        return cached
+
+    if np.isnan(latitude) or np.isnan(longitude) or not radii:
+        hits = np.array([], dtype=np.int64)
+        distances = np.array([], dtype=np.float64)
+    else:
+        point = unit_sphere_coordinates([latitude], [longitude])[0]
+        hits = np.asarray(svi_data['tree'].query_ball_point(point, chord_length(max(radii))), dtype=np.int64)
+        distances = np.linalg.norm(svi_data['tract_xyz'][hits] - point, axis=1)
+    positions = svi_data['indexed_tracts'][hits]
+    tracts = {}
+    for radius in radii:
+        within = np.sort(positions[distances <= chord_length(radius)])
+        within.flags.writeable = False
+        tracts[radius] = within
+    _cache_tract_sets([key], [tracts])
+    return tracts
+
+def facility_coordinates(gis_data, facility_address):
+    """
+    Return the (latitude, longitude) of a facility given as a (latitude, longitude) pair, or as an address
+    tuple geocoded with gis_data['geocoder'].
+    """
+    if len(facility_address) == 2:
+        return float(facility_address[0]), float(facility_address[1])
+    if 'geocoder' in gis_data:
+        return gis_data['geocoder'].geocode(facility_address)
+    raise ValueError("No geocoder available to locate facility address %r" % (facility_address,))
+
+def fips_codes(values):
+    """
+    Return FIPS codes given as integers or strings (with or without leading zeros) as an int64 array.
+    """
+    return np.asarray(values).astype(np.int64).reshape(-1)
+
+def get_radius_svis(svi_data, facility_address, radius):
+    """
+    Return the SVIs of all census tracts within radius of facility_address.
+    """
+    latitude, longitude = facility_coordinates(svi_data, facility_address)
+    return svi_data['svi'][query_radius_tracts(svi_data, latitude, longitude, radius)]
+
+def get_county_svis(svi_data, county):
+    """
+    Return the SVIs of all census tracts in a county.
+    """
+    return svi_data['svi'][county_tract_indices(svi_data, [county])]
+
+def get_regional_svis(svi_data, counties_list):
+    """
+    Return the SVIs of all census tracts in a region made up of counties_list.
+    """
+    return svi_data['svi'][county_tract_indices(svi_data, counties_list)]
+
+def svi_threshold(svis, percentile=75):
+    """
+    Return the given percentile of an array of SVIs, ignoring tracts without an SVI, or infinity if none have one.
+    """
+    svis = svis[~np.isnan(svis)]
+    return stats.scoreatpercentile(svis, percentile) if len(svis) else np.inf
+
+_SVI_VERSIONS = itertools.count(1)
+_THRESHOLD_CACHE = {} # (SVI data version, county FIPS codes, percentile) -> threshold
+
+def clear_threshold_cache():
+    """
+    Discard all cached county and regional SVI thresholds. Called whenever SVI data is (re)loaded.
+    """
+    _THRESHOLD_CACHE.clear()
+
+def get_svi_threshold(svi_data, counties_list, percentile=75):
+    """
+    Return the SVI percentile threshold for a county or region, computing it only on first use.
+
+    Thresholds depend only on the SVI data and the counties compared against, not the facility, so they
+    are cached by (SVI data version, counties, percentile).
+
+    Parameters
+    ----------
+    svi_data : dict
+        SVI arrays from load_svi_data
+
+    counties_list : list
+        5-digit county FIPS codes making up the county or region
+
+    percentile : float
+        Percentile of the county or regional SVI distribution
+
+    Returns
+    -------
+    threshold : float
+        SVI at the given percentile, see svi_threshold
+    """
+    key = (int(svi_data['version']), tuple(np.unique(fips_codes(counties_list)).tolist()), percentile)
+    if key not in _THRESHOLD_CACHE:
+        _THRESHOLD_CACHE[key] = svi_threshold(get_regional_svis(svi_data, counties_list), percentile)
+    return _THRESHOLD_CACHE[key]
+
+def county_svi_thresholds(svi_data, percentile=75):
+    """
+    Return the SVI percentile threshold of every county at once.
+
+    Tracts are sorted once by (county, SVI), after which each county's percentile is read off its slice of
+    the sorted SVIs by linear interpolation, matching scipy.stats.scoreatpercentile county by county.
+
+    Parameters
+    ----------
+    svi_data : dict
+        SVI arrays from load_svi_data, including the county index
+
+    percentile : float
+        Percentile of each county's SVI distribution
+
+    Returns
+    -------
+    thresholds : ndarray
+        Threshold for each county in svi_data['counties'], ignoring tracts without an SVI, or infinity for
+        counties where no tract has one
+    """
+    offsets = svi_data['county_offsets']
+    county_of_tract = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    sorted_svis = svi_data['svi'][np.lexsort((svi_data['svi'], county_of_tract))] # NaNs sort last per county
+    n_valid = np.bincount(county_of_tract[~np.isnan(svi_data['svi'])], minlength=len(offsets) - 1)
+
+    position = percentile / 100 * np.maximum(n_valid - 1, 0)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, np.maximum(n_valid - 1, 0))
+    lower_svis = sorted_svis[offsets[:-1] + lower]
+    upper_svis = sorted_svis[offsets[:-1] + upper]
+    thresholds = lower_svis + (upper_svis - lower_svis) * (position - lower)
+    thresholds[n_valid == 0] = np.inf
+    return thresholds
+
+def lookup_county_thresholds(svi_data, counties):
+    """
+    Return the precomputed 75th percentile SVI threshold for each of an array of 5-digit county FIPS codes,
+    or infinity for counties without tracts.
+    """
+    counties = fips_codes(counties)
+    county_index = np.minimum(np.searchsorted(svi_data['counties'], counties), len(svi_data['counties']) - 1)
+    found = svi_data['counties'][county_index] == counties
+    return np.where(found, svi_data['county_thresholds'][county_index], np.inf)
+
+def build_extrema_flags(svi_data, counties_list=None):
+    """
+    Flag the census tracts in the top SVI quartile of their county and of the region, and store the flags in
+    svi_data.
+
+    Whether a tract counts towards a facility's vulnerability score depends only on the tract, so flagging
+    tracts once at load time turns each facility's count into a sum over its local tracts.
+
+    Parameters
+    ----------
+    svi_data : dict
+        SVI arrays from load_svi_data, including the county index and thresholds
+
+    counties_list : list, optional
+        Counties making up the region. Defaults to COUNTIES_LIST.
+
+    Returns
+    -------
+    svi_data : dict
+        svi_data with boolean 'top_county' and 'top_region' arrays added, and the sorted county FIPS codes
+        the regional flags were built for as 'region_counties'
+    """
+    if counties_list is None:
+        counties_list = COUNTIES_LIST
+    svi_data['region_counties'] = np.unique(fips_codes(counties_list))
+    with np.errstate(invalid='ignore'):
+        svi_data['top_county'] = svi_data['svi'] >= lookup_county_thresholds(svi_data, svi_data['fips'] // 1_000_000)
+        svi_data['top_region'] = svi_data['svi'] >= get_svi_threshold(svi_data, counties_list)
+    return svi_data
+
+def svi_extrema_flags(svi_data):
+    """
+    Return the per-tract top quartile flags for SVI_COMPARISON, or None if no SVI comparison is made.
+
+    The regional flags are rebuilt first if COUNTIES_LIST has changed since they were built.
+    """
+    if SVI_COMPARISON == 'region':
+        region_counties = svi_data.get('region_counties') # absent from stores compiled before it was kept
+        if region_counties is None or not np.array_equal(region_counties, np.unique(fips_codes(COUNTIES_LIST))):
+            build_extrema_flags(svi_data)
+        return svi_data['top_region']
+    elif SVI_COMPARISON == 'county':
+        return svi_data['top_county']
+    return None
+
+def count_svi_extrema(svi_data, facility_address):
+    """
+    Return the number of census tracts within RADIUS of facility_address that are in the top quartile of SVI
+    for their county or region, depending on SVI_COMPARISON.
+    """
+    # Local SVI extrema counts (relative to county and region)
+    flags = svi_extrema_flags(svi_data)
+    if flags is None:
+        return 0
+    latitude, longitude = facility_coordinates(svi_data, facility_address)
+    return np.count_nonzero(flags[query_radius_tracts(svi_data, latitude, longitude, RADIUS)])
+
+def get_radius_tracts_batch(gis_data, latitudes, longitudes, radius):
+    """
+    Return the census tracts within radius of each of an array of facility locations.
+
+    All facilities are queried together with a single dual-tree traversal of a KD-tree over the facility
+    locations against the tract index, rather than one ball query per facility. Facilities without
+    coordinates (NaN, e.g. addresses the geocoder could not locate) have no tracts.
+
+    Parameters
+    ----------
+    gis_data : dict
+        SVI and tract centroid arrays from load_svi_data, including the tract spatial index
+
+    latitudes, longitudes : array_like
+        Facility coordinates in degrees
+
+    radius : float
+        Radius in miles around each facility
+
+    Returns
+    -------
+    offsets : ndarray
+        int64 array of length len(latitudes) + 1. The tracts for facility i are
+        tract_indices[offsets[i]:offsets[i + 1]].
+
+    tract_indices : ndarray
+        Positions in gis_data of the tracts within radius of each facility, sorted within each facility
+    """
+    return get_multi_radius_tracts_batch(gis_data, latitudes, longitudes, [radius])[float(radius)]
+
+def get_multi_radius_tracts_batch(gis_data, latitudes, longitudes, radii=None):
+    """
+    Return the census tracts within each of several radii of each of an array of facility locations.
+
+    All facilities and radii share a single dual-tree traversal at the largest radius; the pairs within each
+    smaller radius are then selected by their chord distance. Tract sets are cached per location like those
+    of query_multi_radius_tracts, so only locations not seen before (de-duplicated) are traversed.
+
+    Parameters
+    ----------
+    gis_data : dict
+        SVI and tract centroid arrays from load_svi_data, including the tract spatial index
+
+    latitudes, longitudes : array_like
+        Facility coordinates in degrees
+
+    radii : sequence of float, optional
+        Radii in miles around each facility. Defaults to RADII.
+
+    Returns
+    -------
+    tracts : dict
+        Maps each radius to an (offsets, tract_indices) pair as returned by get_radius_tracts_batch
+    """
+    if radii is None:
+        radii = RADII
+    radii = tuple(float(radius) for radius in radii)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    located = np.flatnonzero(~np.isnan(latitudes) & ~np.isnan(longitudes))
+    empty = np.array([], dtype=np.int64)
+    tract_sets = [dict.fromkeys(radii, empty)] * len(latitudes)
+    if radii and len(located):
+        version = int(gis_data['version'])
+        keys = [(version, latitude, longitude, radii)
+                for latitude, longitude in zip(latitudes[located].tolist(), longitudes[located].tolist())]
+        for position, tracts in zip(located, _cached_tract_sets(keys)):
+            tract_sets[position] = tracts
+
+        missing = np.array([position for position in located if tract_sets[position] is None], dtype=np.int64)
+        if len(missing):
+            locations, inverse = np.unique(np.column_stack([latitudes[missing], longitudes[missing]]), axis=0,
+                                           return_inverse=True)
+            new_sets = _traverse_multi_radius(gis_data, locations[:, 0], locations[:, 1], radii)
+            _cache_tract_sets([(version, latitude, longitude, radii) for latitude, longitude in locations.tolist()],
+                              new_sets)
+            for position, location in zip(missing, inverse.reshape(-1)):
+                tract_sets[position] = new_sets[location]
+
+    results = {}
+    for radius in radii:
+        offsets = np.zeros(len(latitudes) + 1, dtype=np.int64)
+        np.cumsum([len(tracts[radius]) for tracts in tract_sets], out=offsets[1:])
+        tract_indices = np.concatenate([tracts[radius] for tracts in tract_sets]) if tract_sets else empty
+        results[radius] = offsets, tract_indices.astype(np.int64, copy=False)
+    return results
+
+def _traverse_multi_radius(gis_data, latitudes, longitudes, radii):
+    # Return a {radius: sorted tract positions} dict per location from one dual-tree traversal at the largest radius
+    facility_tree = spatial.cKDTree(unit_sphere_coordinates(latitudes, longitudes))
+    pairs = facility_tree.sparse_distance_matrix(gis_data['tree'], chord_length(max(radii)), output_type='ndarray')
+    order = np.lexsort((gis_data['indexed_tracts'][pairs['j']], pairs['i']))
+    facilities = pairs['i'][order]
+    tracts = gis_data['indexed_tracts'][pairs['j']][order]
+    distances = pairs['v'][order]
+
+    tract_sets = [{} for _ in range(len(latitudes))]
+    for radius in radii:
+        within = distances <= chord_length(radius)
+        bounds = np.cumsum(np.bincount(facilities[within], minlength=len(latitudes)))[:-1]
+        for location, positions in enumerate(np.split(tracts[within], bounds)):
+            positions.flags.writeable = False
+            tract_sets[location][radius] = positions
+    return tract_sets
+
+def count_svi_extrema_batch(svi_data, latitudes, longitudes):
+    """
+    Return count_svi_extrema for an array of facility locations, using one batched radius query.
+
+    Parameters
+    ----------
+    svi_data : dict
+        SVI and tract centroid arrays from load_svi_data
+
+    latitudes, longitudes : array_like
+        Facility coordinates in degrees
+
+    Returns
+    -------
+    counts : ndarray
+        Number of local census tracts in the top SVI quartile for each facility
+    """
+    return count_svi_extrema_multi_radius_batch(svi_data, latitudes, longitudes, [RADIUS])[:, 0]
+
+def count_svi_extrema_multi_radius(svi_data, facility_address, radii=None):
+    """
+    Return count_svi_extrema of facility_address for each of several radii (defaulting to RADII), as a dict
+    keyed by radius.
+    """
+    if radii is None:
+        radii = RADII
+    flags = svi_extrema_flags(svi_data)
+    if flags is None:
+        return {float(radius): 0 for radius in radii}
+    latitude, longitude = facility_coordinates(svi_data, facility_address)
+    tracts = query_multi_radius_tracts(svi_data, latitude, longitude, radii)
+    return {radius: np.count_nonzero(flags[positions]) for radius, positions in tracts.items()}
+
+def count_svi_extrema_multi_radius_batch(svi_data, latitudes, longitudes, radii=None):
+    """
+    Return count_svi_extrema for an array of facility locations at each of several radii, using one batched
+    radius query.
+
+    Parameters
+    ----------
+    svi_data : dict
+        SVI and tract centroid arrays from load_svi_data
+
+    latitudes, longitudes : array_like
+        Facility coordinates in degrees
+
+    radii : sequence of float, optional
+        Radii in miles around each facility. Defaults to RADII.
+
+    Returns
+    -------
+    counts : ndarray
+        int64 array of shape (len(latitudes), len(radii)) with the number of census tracts within each radius
+        of each facility that are in the top SVI quartile
+    """
+    if radii is None:
+        radii = RADII
+    flags = svi_extrema_flags(svi_data)
+    if flags is None:
+        return np.zeros((len(latitudes), len(radii)), dtype=np.int64)
+    return count_flagged_tracts(svi_data, latitudes, longitudes, flags, radii)
+
+def count_flagged_tracts(svi_data, latitudes, longitudes, flags, radii):
+    """
+    Return the number of census tracts marked in the boolean array flags within each of radii of each of an
+    array of facility locations, as an int64 array of shape (len(latitudes), len(radii)).
+    """
+    counts = np.zeros((len(latitudes), len(radii)), dtype=np.int64)
+    tracts = get_multi_radius_tracts_batch(svi_data, latitudes, longitudes, radii)
+    for column, radius in enumerate(radii):
+        offsets, tract_indices = tracts[float(radius)]
+        flagged = np.zeros(len(tract_indices) + 1, dtype=np.int64)
+        np.cumsum(flags[tract_indices], out=flagged[1:])
+        counts[:, column] = flagged[offsets[1:]] - flagged[offsets[:-1]]
+    return counts
+
+def facility_addresses(dat):
+    """
+    Return a list of facility_address tuples (street_name_and_number, city, state, zip) for each row of dat.
+    """
+    # pandas reads ZIP codes as floats once any is missing, so parts are formatted with address_part
+    columns = [dat[column].map(address_part) for column in ADDRESS_COLUMNS]
+    return list(zip(*columns))
+
+def facility_locations(dat, gis_data):
+    """
+    Return arrays of facility latitudes and longitudes for dat, taken from the "Latitude" and "Longitude"
+    columns if present and otherwise geocoded from the address columns with gis_data['geocoder'].
+    """
+    if all(column in dat for column in LOCATION_COLUMNS):
+        return dat["Latitude"].to_numpy(dtype=np.float64), dat["Longitude"].to_numpy(dtype=np.float64)
+    if 'geocoder' in gis_data:
+        return gis_data['geocoder'].geocode_many(facility_addresses(dat))
+    raise ValueError("Requests need %s columns or a geocoder to locate facilities" % " and ".join(LOCATION_COLUMNS))
+
+def score_svi_counts(dat, svi_data):
+    """
+    Return count_svi_extrema for every request in dat, using a single batched radius query.
+    """
+    return count_svi_extrema_batch(svi_data, *facility_locations(dat, svi_data))
+
+####################
+## Exposure score ##
+####################
+
+COVID_POINTS = 10 # currently treating patients with COVID-19
+ICU_POINTS = 6 # has an ICU
+AEROSOL_POINTS = 3 # aerosol generating procedures but is not an ICU (e.g. freestanding ERs, paramedics)
+
+####################
+## Capacity score ##
+####################
+
+# Bed and ICU occupancy points are taken from OCCUPANCY_POINTS. Facilities that do not report occupancy
+# receive the regional median points, and ICU occupancy only counts for facilities with an ICU.
+
+##########################
+## Total Priority Score ##
+##########################
+
+# Domain scores written by score_requests, followed by the total priority score
+DOMAINS = ("need", "vuln", "exposure", "capacity")
+SCORE_DTYPE = np.dtype([(domain, np.float32) for domain in DOMAINS] + [("priority", np.float32)])
+
+def median_occupancy_points(codes):
+    """
+    Return the median occupancy points over the facilities that reported occupancy, or 0 if none did.
+    """
+    points = OCCUPANCY_POINTS_TABLE[codes[codes != 0]]
+    return np.median(points) if len(points) else 0
+
+def occupancy_points(codes, median_points):
+    """
+    Return occupancy points for an array of occupancy codes, assigning median_points where not reported.
+    """
+    points = OCCUPANCY_POINTS_TABLE[codes]
+    points[codes == 0] = median_points
+    return points
+
+def domain_weights():
+    """
+    Return the current domain weighting multipliers as a float32 array ordered like DOMAINS.
+    """
+    return np.array([NEED_WEIGHT, VULN_WEIGHT, EXPOSURE_WEIGHT, CAPCITY_WEIGHT], dtype=np.float32)
+
+def score_requests(dat, svi_counts=None, median_bed_points=None, median_icu_points=None, weights=None,
+                   taxonomy=None):
+    """
+    Return weighted domain scores and the total priority score for every request in dat.
+
+    Each domain is computed with vectorized numpy passes over its request columns and accumulated in place
+    into the fields of one preallocated structured array, which also holds the total.
+
+    Parameters
+    ----------
+    dat : DataFrame
+        Request data, either raw or encoded with encode_requests
+
+    svi_counts : array_like, optional
+        Number of local census tracts in the top SVI quartile for each request (see count_svi_extrema).
+        Vulnerability is scored on facility type alone if omitted.
+
+    median_bed_points, median_icu_points : float, optional
+        Occupancy points assigned to facilities that do not report bed or ICU occupancy. Defaults to the
+        median over the reporting facilities in dat.
+
+    weights : array_like, optional
+        Domain weighting multipliers ordered like DOMAINS. Defaults to the module weighting options.
+
+    taxonomy : FacilityTaxonomy, optional
+        Taxonomy used to parse facility types and identify vulnerable facilities. Defaults to the current
+        taxonomy.
+
+    Returns
+    -------
+    scores : ndarray
+        Structured array with SCORE_DTYPE holding the weighted need, vuln, exposure and capacity scores and
+        their sum, priority, for each row of dat
+    """
+    scores = np.zeros(len(dat), dtype=SCORE_DTYPE)
+
+    # Urgency
+    urgency_points(dat, out=scores["need"])
+
+    # Vulnerability
+    vuln = scores["vuln"]
+    if taxonomy is None:
+        taxonomy = get_taxonomy()
+    vuln += popcount(facility_masks(dat, taxonomy) & taxonomy.vuln_mask)
+    if svi_counts is not None:
+        vuln += svi_counts
+
+    # Exposure
+    has_covid = request_flags(dat, "COVID Patients")
+    has_icu = request_flags(dat, "ICU")
+    aerosols = request_flags(dat, "Aerosol Generating Procedures")
+    exposure = scores["exposure"]
+    exposure += COVID_POINTS * has_covid
+    exposure += ICU_POINTS * has_icu
+    exposure += AEROSOL_POINTS * (aerosols & ~has_icu)
+
+    # Capacity
+    capacity = scores["capacity"]
+    bed_codes = request_codes(dat, "Bed Occupancy")
+    if median_bed_points is None:
+        median_bed_points = median_occupancy_points(bed_codes)
+    capacity += occupancy_points(bed_codes, median_bed_points)
+
+    icu_codes = request_codes(dat, "ICU Occupancy")
+    if median_icu_points is None:
+        median_icu_points = median_occupancy_points(icu_codes[has_icu])
+    capacity += has_icu * occupancy_points(icu_codes, median_icu_points)
+
+    # Weighting and total
+    if weights is None:
+        weights = domain_weights()
+    priority = scores["priority"]
+    for domain, weight in zip(DOMAINS, weights):
+        scores[domain] *= weight
+        priority += scores[domain]
+    return scores
+
+def score_request_row(dat, row_idx, svi_count=None, **kwargs):
+    """
+    Return the scores for a single request as a SCORE_DTYPE record, see score_requests.
+    """
+    svi_counts = None if svi_count is None else [svi_count]
+    return score_requests(dat.loc[[row_idx]], svi_counts, **kwargs)[0]
+
+class SubscoreStore:
+    """
+    Columnar store of unweighted domain scores for a batch of requests.
+
+    Domain scores are kept as an N x 4 float32 matrix ordered like DOMAINS, so changing the domain weights
+    only needs a single matrix-vector product instead of rescoring every request.
+
+    Parameters
+    ----------
+    subscores : array_like
+        N x 4 matrix of unweighted domain scores
+
+    index : Index, optional
+        Request labels for the rows of subscores
+    """
+
+    def __init__(self, subscores, index=None):
+        self.subscores = np.ascontiguousarray(subscores, dtype=np.float32)
+        self.index = pd.RangeIndex(len(self.subscores)) if index is None else index
+
+    @classmethod
+    def from_requests(cls, dat, svi_counts=None, **kwargs):
+        """
+        Score dat without weighting and return the resulting store, see score_requests.
+        """
+        scores = score_requests(dat, svi_counts, weights=np.ones(len(DOMAINS)), **kwargs)
+        subscores = np.column_stack([scores[domain] for domain in DOMAINS])
+        return cls(subscores, dat.index)
+
+    def __len__(self):
+        return len(self.subscores)
+
+    def reweight(self, weights=None):
+        """
+        Return total priority scores and the priority ranking under a new set of domain weights.
+
+        Parameters
+        ----------
+        weights : array_like, optional
+            Domain weighting multipliers ordered like DOMAINS. Defaults to the module weighting options.
+
+        Returns
+        -------
+        priority : ndarray
+            Weighted priority score for each request
+
+        ranking : ndarray
+            Row positions ordered from highest to lowest priority, with ties kept in row order
+        """
+        if weights is None:
+            weights = domain_weights()
+        priority = self.subscores @ np.asarray(weights, dtype=np.float32)
+        ranking = np.argsort(-priority, kind='stable')
+        return priority, ranking
+
+    def sweep(self, weight_grid, baseline=None, chunk_size=32):
+        """
+        Return the range of priority ranks each request takes over a grid of domain weights.
+
+        The weight grid is broadcast against the stored subscores a chunk of grid points at a time, so memory
+        use is bounded by chunk_size rather than the size of the grid.
+
+        Parameters
+        ----------
+        weight_grid : array_like
+            G x 4 array of domain weighting multipliers ordered like DOMAINS
+
+        baseline : array_like, optional
+            Baseline domain weights to compare against. Defaults to the module weighting options.
+
+        chunk_size : int
+            Number of grid points to rank at once
+
+        Returns
+        -------
+        rank_ranges : DataFrame
+            Baseline, minimum and maximum rank (1 is highest priority) of each request across the grid
+
+        taus : ndarray
+            Kendall's tau between the baseline priority scores and the priority scores at each grid point
+        """
+        weight_grid = np.atleast_2d(np.asarray(weight_grid, dtype=np.float32))
+        baseline_priority, baseline_ranking = self.reweight(baseline)
+        baseline_rank = np.empty(len(self), dtype=np.int64)
+        baseline_rank[baseline_ranking] = np.arange(1, len(self) + 1)
+
+        min_rank = baseline_rank.copy()
+        max_rank = baseline_rank.copy()
+        taus = np.empty(len(weight_grid))
+        positions = np.arange(1, len(self) + 1)[:, np.newaxis]
+        for start in range(0, len(weight_grid), chunk_size):
+            priority = self.subscores @ weight_grid[start:start + chunk_size].T
+            ranking = np.argsort(-priority, axis=0, kind='stable')
+            rank = np.empty(priority.shape, dtype=np.int64)
+            np.put_along_axis(rank, ranking, positions, axis=0)
+            np.minimum(min_rank, rank.min(axis=1), out=min_rank)
+            np.maximum(max_rank, rank.max(axis=1), out=max_rank)
+            for offset in range(priority.shape[1]):
+                taus[start + offset] = stats.kendalltau(baseline_priority, priority[:, offset])[0]
+
+        rank_ranges = pd.DataFrame({"baseline_rank": baseline_rank, "min_rank": min_rank, "max_rank": max_rank},
+                                   index=self.index)
+        return rank_ranges, taus
+
+class IncrementalScorer:
+    """
+    Rescore only the requests whose scoring inputs changed since the previous cycle.
+
+    A content hash of the SCORING_COLUMNS (and the SVI count, if given) is kept for each request id (the
+    index of the request frame). Requests whose hash is unchanged reuse their cached unweighted domain
+    scores; new and changed requests are passed through score_requests. After a facility taxonomy reload,
+    only facilities whose parsed type mask changed or intersects the changed facility types are rescored.
+    """
+
+    def __init__(self):
+        self._hashes = np.array([], dtype=np.uint64)
+        self._subscores = np.empty((0, len(DOMAINS)), dtype=np.float32)
+        self._index = pd.Index([])
+        self._medians = None
+        self._taxonomy = None
+        self.dirty = np.array([], dtype=bool) # rows rescored by the most recent call to rescore
+
+    def rescore(self, dat, svi_counts=None):
+        """
+        Return a SubscoreStore for dat, rescoring only new or changed requests.
+
+        Parameters
+        ----------
+        dat : DataFrame
+            Request data for this cycle, indexed by unique request id
+
+        svi_counts : array_like, optional
+            Number of local census tracts in the top SVI quartile for each request, see score_requests
+
+        Returns
+        -------
+        store : SubscoreStore
+            Unweighted domain scores for every row of dat
+        """
+        taxonomy = get_taxonomy()
+        masks = facility_masks(dat, taxonomy)
+        hashes = row_hashes(dat, svi_counts, masks)
+        position = self._index.get_indexer(dat.index)
+        dirty = position < 0
+        cached = ~dirty
+        dirty[cached] = self._hashes[position[cached]] != hashes[cached]
+        if self._taxonomy is not None and taxonomy is not self._taxonomy:
+            dirty |= in_facility_group(masks, taxonomy.changes(self._taxonomy))
+
+        # Facilities that do not report occupancy are scored with the median over all facilities, so they
+        # must be rescored whenever that median moves.
+        bed_codes = request_codes(dat, "Bed Occupancy")
+        icu_codes = request_codes(dat, "ICU Occupancy")
+        has_icu = request_flags(dat, "ICU")
+        medians = (median_occupancy_points(bed_codes), median_occupancy_points(icu_codes[has_icu]))
+        if self._medians is not None and medians[0] != self._medians[0]:
+            dirty |= bed_codes == 0
+        if self._medians is not None and medians[1] != self._medians[1]:
+            dirty |= has_icu & (icu_codes == 0)
+
+        subscores = np.empty((len(dat), len(DOMAINS)), dtype=np.float32)
+        subscores[~dirty] = self._subscores[position[~dirty]]
+        if dirty.any():
+            changed = SubscoreStore.from_requests(dat[dirty].assign(**{"Facility Type": masks[dirty]}),
+                                                  None if svi_counts is None else np.asarray(svi_counts)[dirty],
+                                                  median_bed_points=medians[0],
+                                                  median_icu_points=medians[1])
+            subscores[dirty] = changed.subscores
+
+        self._hashes = hashes
+        self._subscores = subscores
+        self._index = dat.index
+        self._medians = medians
+        self._taxonomy = taxonomy
+        self.dirty = dirty
+        return SubscoreStore(subscores, dat.index)
+
+def row_hashes(dat, svi_counts=None, masks=None):
+    """
+    Return a uint64 content hash of the scoring inputs (SCORING_COLUMNS and svi_counts) for each row of dat.
+    If given, the facility type masks are hashed in place of the raw "Facility Type" column.
+    """
+    inputs = dat[[column for column in SCORING_COLUMNS if column in dat]]
+    if masks is not None:
+        inputs = inputs.assign(**{"Facility Type": masks})
+    if svi_counts is not None:
+        inputs = inputs.assign(svi_count=svi_counts)
+    return pd.util.hash_pandas_object(inputs, index=False).to_numpy()
+
+######################
+## Priority ranking ##
+######################
+
+def top_k(priority, k):
+    """
+    Return the row positions of the k highest priority requests without sorting every score.
+
+    Parameters
+    ----------
+    priority : array_like
+        Priority score for each request
+
+    k : int
+        Number of requests to select
+
+    Returns
+    -------
+    selected : ndarray
+        Row positions of the k highest priority requests, ordered from highest to lowest priority. Ties are
+        broken in favor of the earlier row, and missing (NaN) priorities rank lowest.
+    """
+    priority = np.asarray(priority, dtype=np.float64)
+    priority = np.where(np.isnan(priority), -np.inf, priority) # argpartition would rank NaN highest
+    k = min(k, len(priority))
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+
+    # Partial selection finds the k-th highest score; everything above it is selected and ties at the
+    # boundary are filled in row order so the result does not depend on the partition algorithm.
+    kth_score = priority[np.argpartition(priority, len(priority) - k)[len(priority) - k]]
+    above = np.flatnonzero(priority > kth_score)
+    ties = np.flatnonzero(priority == kth_score)[:k - len(above)]
+    selected = np.concatenate([above, ties])
+    return selected[np.lexsort((selected, -priority[selected]))]
+
+def facility_tiers(masks, taxonomy=None):
+    """
+    Return the allocation tier of each facility type mask: 1 for GROUP_1_FACILITIES, 2 for GROUP_2_FACILITEIS
+    and 3 for all other facilities. Facilities in both groups are placed in tier 1.
+    """
+    taxonomy = taxonomy or get_taxonomy()
+    tiers = np.full(len(masks), 3, dtype=np.int8)
+    tiers[in_facility_group(masks, taxonomy.group_2_mask)] = 2
+    tiers[in_facility_group(masks, taxonomy.group_1_mask)] = 1
+    return tiers
+
+def tiered_ranking(dat, priority, tie_breakers=()):
+    """
+    Return requests ranked by facility group tier, then priority score, then tie_breakers.
+
+    The whole ranking is produced by one stable multi-key sort, rather than ranking each tier separately and
+    concatenating the results.
+
+    Parameters
+    ----------
+    dat : DataFrame
+        Request data with a "Facility Type" column, either raw or encoded with encode_requests
+
+    priority : array_like
+        Priority score for each row of dat
+
+    tie_breakers : sequence of array_like, optional
+        Additional keys for requests with the same tier and priority score, most significant first. Each
+        key is sorted in ascending order; negate a key to sort it in descending order.
+
+    Returns
+    -------
+    ranking : ndarray
+        Row positions ordered by tier (1 first), then highest priority, then tie_breakers. Requests tied on
+        every key are kept in row order.
+    """
+    taxonomy = get_taxonomy()
+    tiers = facility_tiers(facility_masks(dat, taxonomy), taxonomy)
+    keys = [np.asarray(key) for key in reversed(tie_breakers)] + [-np.asarray(priority), tiers]
+    return np.lexsort(keys)
+
+class StreamingTopK:
+    """
+    Bounded heap holding the k highest priority requests seen so far in a stream.
+
+    Ties are broken in favor of the request pushed first, and missing (NaN) scores rank lowest, matching
+    top_k on the same requests in the same order.
+
+    Parameters
+    ----------
+    k : int
+        Number of requests to keep
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._heap = []
+        self._count = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, request_id, score):
+        """
+        Offer a request to the heap, evicting the current lowest priority request if it is full.
+        """
+        # Later arrivals have a smaller sequence key, so they are evicted first among equal scores
+        entry = (-np.inf if score != score else score, -self._count, request_id, score)
+        self._count += 1
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif self._heap and entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def extend(self, request_ids, scores):
+        """
+        Offer a batch of requests to the heap, in order.
+        """
+        for request_id, score in zip(request_ids, scores):
+            self.push(request_id, score)
+
+    def items(self):
+        """
+        Return a list of (request_id, score) pairs ordered from highest to lowest priority.
+        """
+        return [(request_id, score) for _, _, request_id, score in sorted(self._heap, reverse=True)]
+
+class PriorityIndex:
+    """
+    Live priority queue of requests keyed by request id.
+
+    Requests can be inserted, rescored and removed (e.g. once fulfilled) in O(log n), and the highest
+    priority request is always available without re-ranking the others. Ties are broken in favor of the
+    request inserted first.
+    """
+
+    def __init__(self):
+        self._heap = [] # (sort key, request_id) pairs; the sort key is (-score, insertion order)
+        self._position = {} # request_id -> position in _heap
+        self._count = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, request_id):
+        return request_id in self._position
+
+    def score(self, request_id):
+        """
+        Return the current priority score of a request.
+        """
+        return -self._heap[self._position[request_id]][0][0]
+
+    def insert(self, request_id, score):
+        """
+        Add a request to the index, or update its score if it is already present.
+        """
+        if request_id in self._position:
+            self.update(request_id, score)
+            return
+        self._heap.append(((-score, self._count), request_id))
+        self._count += 1
+        self._position[request_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def update(self, request_id, score):
+        """
+        Change the priority score of a request already in the index.
+        """
+        position = self._position[request_id]
+        (old_key, sequence), _ = self._heap[position]
+        self._heap[position] = ((-score, sequence), request_id)
+        if -score < old_key:
+            self._sift_up(position)
+        else:
+            self._sift_down(position)
+
+    def remove(self, request_id):
+        """
+        Remove a request from the index and return its score.
+        """
+        position = self._position[request_id]
+        score = -self._heap[position][0][0]
+        self._delete(position)
+        return score
+
+    def peek(self):
+        """
+        Return the (request_id, score) pair with the highest priority without removing it.
+        """
+        key, request_id = self._heap[0]
+        return request_id, -key[0]
+
+    def pop(self):
+        """
+        Remove and return the (request_id, score) pair with the highest priority.
+        """
+        request_id, score = self.peek()
+        self._delete(0)
+        return request_id, score
+
+    def _delete(self, position):
+        del self._position[self._heap[position][1]]
+        last = self._heap.pop()
+        if position < len(self._heap):
+            self._heap[position] = last
+            self._position[last[1]] = position
+            self._sift_up(position)
+            self._sift_down(self._position[last[1]])
+
+    def _swap(self, i, j):
+        self._heap[i], self._heap[j] = self._heap[j], self._heap[i]
+        self._position[self._heap[i][1]] = i
+        self._position[self._heap[j][1]] = j
+
+    def _sift_up(self, position):
+        while position > 0:
+            parent = (position - 1) // 2
+            if self._heap[position][0] >= self._heap[parent][0]:
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position):
+        size = len(self._heap)
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._heap[child][0] < self._heap[smallest][0]:
+                    smallest = child
+            if smallest == position:
+                break
+            self._swap(position, smallest)
+            position = smallest
+
+###############
+## Streaming ##
+###############
+
+def read_requests(path, chunksize=50_000, **kwargs):
+    """
+    Yield request data from a CSV, JSON lines or JSON file in DataFrame chunks of at most chunksize rows.
+
+    A .json file holding a single JSON array of records cannot be read incrementally, so it is loaded whole
+    and then split into chunks. Additional keyword arguments are passed to pandas.read_csv or pandas.read_json.
+    """
+    if str(path).endswith('.json') and is_json_array(path):
+        dat = pd.read_json(path, **kwargs)
+        for start in range(0, len(dat), chunksize):
+            yield dat.iloc[start:start + chunksize]
+        return
+    if str(path).endswith(('.jsonl', '.json')):
+        reader = pd.read_json(path, lines=True, chunksize=chunksize, **kwargs)
+    else:
+        reader = pd.read_csv(path, chunksize=chunksize, **kwargs)
+    with reader:
+        yield from reader
+
+def is_json_array(path):
+    """
+    Return whether a JSON file holds a single JSON array rather than JSON lines.
+    """
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                return line.lstrip().startswith('[')
+    return False
+
+def write_requests(dat, path, append=False):
+    """
+    Write request data to a CSV or JSON lines file, optionally appending to an existing file.
+    """
+    mode = 'a' if append else 'w'
+    if str(path).endswith(('.jsonl', '.json')):
+        with open(path, mode) as f:
+            dat.to_json(f, orient='records', lines=True)
+    else:
+        dat.to_csv(path, mode=mode, header=not append, index=False)
+
+def median_points_from_counts(counts):
+    """
+    Return the median occupancy points given the number of facilities reporting each occupancy code.
+    """
+    reported = counts[1:]
+    if reported.sum() == 0:
+        return 0
+    return np.median(np.repeat(OCCUPANCY_POINTS_TABLE[1:], reported))
+
+def stream_occupancy_medians(path, chunksize=50_000):
+    """
+    Return the median bed and ICU occupancy points over every request in a file, reading it in chunks.
+    """
+    bed_counts = np.zeros(len(OCCUPANCY_LEVELS), dtype=np.int64)
+    icu_counts = np.zeros(len(OCCUPANCY_LEVELS), dtype=np.int64)
+    for chunk in read_requests(path, chunksize):
+        bed_counts += np.bincount(request_codes(chunk, "Bed Occupancy"), minlength=len(OCCUPANCY_LEVELS))
+        icu_codes = request_codes(chunk, "ICU Occupancy")[request_flags(chunk, "ICU")]
+        icu_counts += np.bincount(icu_codes, minlength=len(OCCUPANCY_LEVELS))
+    return median_points_from_counts(bed_counts), median_points_from_counts(icu_counts)
+
+def score_stream(input_path, output_path, chunksize=50_000, median_bed_points=None, median_icu_points=None,
+                 svi_data=None):
+    """
+    Score a request file too large to load at once, writing scored requests to output_path as they are produced.
+
+    The input is read and scored one chunk at a time, so peak memory depends on chunksize rather than the size
+    of the file. Unless both occupancy medians are given, a first pass over the occupancy columns computes
+    them so every chunk is scored against the same medians.
+
+    Parameters
+    ----------
+    input_path : str
+        CSV, JSON lines (.jsonl) or JSON (.json, either JSON lines or a JSON array of records) file of request
+        data
+
+    output_path : str
+        CSV or JSON lines (.jsonl) file to write the request data with domain and priority scores
+
+    chunksize : int
+        Maximum number of requests held in memory at once
+
+    median_bed_points, median_icu_points : float, optional
+        Occupancy points assigned to facilities that do not report occupancy, see score_requests
+
+    svi_data : dict, optional
+        SVI arrays from load_svi_data used to count each chunk's local SVI extrema, see score_svi_counts.
+        Vulnerability is scored on facility type alone if omitted.
+
+    Returns
+    -------
+    n_scored : int
+        Number of requests scored
+    """
+    if median_bed_points is None or median_icu_points is None:
+        medians = stream_occupancy_medians(input_path, chunksize)
+        median_bed_points = medians[0] if median_bed_points is None else median_bed_points
+        median_icu_points = medians[1] if median_icu_points is None else median_icu_points
+
+    n_scored = 0
+    for chunk in read_requests(input_path, chunksize):
+        svi_counts = None if svi_data is None else score_svi_counts(chunk, svi_data)
+        scores = score_requests(chunk, svi_counts, median_bed_points=median_bed_points,
+                                median_icu_points=median_icu_points)
+        for field in SCORE_DTYPE.names:
+            chunk[field] = scores[field]
+        write_requests(chunk, output_path, append=n_scored > 0)
+        n_scored += len(chunk)
+    return n_scored
+
+######################
+## Parallel scoring ##
+######################
+
+def share_arrays(arrays):
+    """
+    Copy a dictionary of arrays into shared memory.
+
+    Parameters
+    ----------
+    arrays : dict
+        Dictionary of ndarrays
+
+    Returns
+    -------
+    blocks : list
+        SharedMemory blocks backing the arrays. The caller must close and unlink them when finished.
+
+    spec : dict
+        Picklable description of the shared arrays to pass to attach_arrays
+    """
+    blocks = []
+    spec = {}
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+        blocks.append(block)
+        spec[name] = (block.name, array.shape, array.dtype.str)
+    return blocks, spec
+
+def attach_arrays(spec):
+    """
+    Return the shared memory blocks and read-only array views described by spec, see share_arrays.
+    """
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in spec.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = array
+    return blocks, arrays
+
+_WORKER_TREES = {} # tract spatial indexes built by this worker process, keyed by shared memory block name
+
+def _score_shard(shard, svi_spec, radius, kwargs):
+    """
+    Process pool worker for score_parallel.
+
+    Workers may import this module afresh (e.g. with the spawn start method), so everything that depends on
+    module state - the taxonomy, weights, radius and extrema flags - is resolved by the parent and passed in.
+    """
+    if svi_spec is None:
+        return score_requests(shard, **kwargs)
+    blocks, svi_data = attach_arrays(svi_spec)
+    flags = svi_data.pop('extrema_flags')
+    if 'tract_xyz' in svi_data:
+        # The tree itself is not an array, so each worker builds it once from the shared centroids
+        tree_key = svi_spec['tract_xyz'][0]
+        if tree_key not in _WORKER_TREES:
+            _WORKER_TREES[tree_key] = spatial.cKDTree(svi_data['tract_xyz'])
+        svi_data['tree'] = _WORKER_TREES[tree_key]
+    try:
+        svi_counts = count_flagged_tracts(svi_data, shard["Latitude"], shard["Longitude"], flags, [radius])[:, 0]
+        return score_requests(shard, svi_counts, **kwargs)
+    finally:
+        del svi_data, flags
+        for block in blocks:
+            block.close()
+
+def score_parallel(dat, svi_data=None, shard_column="State", max_workers=None, **kwargs):
+    """
+    Score requests on a process pool, one shard of requests per state (or other shard_column value).
+
+    The read-only SVI arrays are placed in shared memory once and attached by each worker rather than
+    pickled for every shard. Requests are encoded, and occupancy medians, weights, the taxonomy and the
+    tracts flagged by SVI_COMPARISON are resolved, before sharding, so the scores match score_requests on the
+    whole frame whichever process start method the pool uses.
+
+    Parameters
+    ----------
+    dat : DataFrame
+        Request data
+
+    svi_data : dict, optional
+        SVI arrays from load_svi_data. Vulnerability is scored on facility type alone if omitted.
+
+    shard_column : str
+        Request column used to shard requests, e.g. "State" or a region label
+
+    max_workers : int, optional
+        Number of worker processes, see concurrent.futures.ProcessPoolExecutor
+
+    **kwargs
+        Passed to score_requests
+
+    Returns
+    -------
+    scores : ndarray
+        SCORE_DTYPE structured array of scores for each row of dat
+
+    ranking : ndarray
+        Row positions ordered from highest to lowest priority, with ties kept in row order
+    """
+    if kwargs.get("taxonomy") is None:
+        kwargs["taxonomy"] = get_taxonomy()
+    if kwargs.get("weights") is None:
+        kwargs["weights"] = domain_weights()
+    dat = encode_requests(dat, kwargs["taxonomy"])
+
+    if kwargs.get("median_bed_points") is None:
+        kwargs["median_bed_points"] = median_occupancy_points(request_codes(dat, "Bed Occupancy"))
+    if kwargs.get("median_icu_points") is None:
+        has_icu = request_flags(dat, "ICU")
+        kwargs["median_icu_points"] = median_occupancy_points(request_codes(dat, "ICU Occupancy")[has_icu])
+
+    # Workers only receive the SVI arrays, so facilities are geocoded here, sharing one geocoding cache
+    if svi_data is not None and not all(column in dat for column in LOCATION_COLUMNS):
+        latitudes, longitudes = facility_locations(dat, svi_data)
+        dat = dat.assign(Latitude=latitudes, Longitude=longitudes)
+
+    shard_positions = list(dat.groupby(shard_column, dropna=False).indices.values())
+
+    blocks, svi_spec = [], None
+    if svi_data is not None:
+        flags = svi_extrema_flags(svi_data)
+        arrays = {name: value for name, value in svi_data.items() if isinstance(value, np.ndarray)}
+        arrays['extrema_flags'] = np.zeros(len(svi_data['fips']), dtype=bool) if flags is None else flags
+        blocks, svi_spec = share_arrays(arrays)
+    try:
+        with ProcessPoolExecutor(max_workers) as pool:
+            futures = [pool.submit(_score_shard, dat.iloc[positions], svi_spec, RADIUS, kwargs)
+                       for positions in shard_positions]
+            scores = np.zeros(len(dat), dtype=SCORE_DTYPE)
+            for positions, future in zip(shard_positions, futures):
+                scores[positions] = future.result()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
 
-priority_score = need_score + vuln_score + exposure_score + capacity_score
+    ranking = np.argsort(-scores["priority"], kind='stable')
+    return scores, ranking
@@ -0,0 +1,258 @@
+import functools
+import json
+import multiprocessing
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "code"))
+import priority_algorithm as pa  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def restore_taxonomy():
+    taxonomy = pa.get_taxonomy()
+    yield
+    pa._TAXONOMY = taxonomy
+
+
+@pytest.fixture
+def svi_data(tmp_path):
+    rng = np.random.default_rng(0)
+    rows = []
+    for c in range(12):
+        county = (36 if c < 6 else 6) * 1000 + 1 + 2 * c
+        center_lat, center_lon = 38 + rng.random() * 4, -110 + rng.random() * 20
+        for t in range(60):
+            rows.append((county * 1_000_000 + 100 + t, center_lat + rng.normal() * 0.3,
+                         center_lon + rng.normal() * 0.3))
+    tracts = pd.DataFrame(rows, columns=["FIPS", "lat", "lon"])
+    tracts["RPL_THEMES"] = rng.random(len(tracts)).round(4)
+    tracts.loc[rng.choice(len(tracts), 25, replace=False), "RPL_THEMES"] = -999
+    tracts.loc[tracts["FIPS"] // 1_000_000 == 6023, "RPL_THEMES"] = -999 # a county without any SVI
+    tracts[["FIPS", "RPL_THEMES"]].sample(frac=1, random_state=1).to_csv(tmp_path / "svi.csv", index=False)
+    pd.DataFrame({"GEOID": tracts["FIPS"], "INTPTLAT": tracts["lat"], "INTPTLONG ": tracts["lon"]}).to_csv(
+        tmp_path / "gazetteer.txt", sep="\t", index=False)
+    return pa.load_svi_data(tmp_path / "svi.csv", tmp_path / "gazetteer.txt")
+
+
+def make_requests(n, seed=0):
+    rng = np.random.default_rng(seed)
+    occupancy = list(pa.OCCUPANCY_LEVELS[1:]) + [None]
+    return pd.DataFrame({
+        "Current Supply": rng.choice(list(pa.SUPPLY_LEVELS[1:]) + [None], n),
+        "Item Surge Capacity": rng.choice(list(pa.SURGE_LEVELS[1:]) + [None], n),
+        "Facility Type": rng.choice(["ach", "fqhc", "ach, dsh", "homeless shelter", "nursing home", "gh",
+                                     "widget", "ems"], n),
+        "COVID Patients": rng.random(n) < 0.5,
+        "ICU": rng.random(n) < 0.3,
+        "Aerosol Generating Procedures": rng.random(n) < 0.4,
+        "Bed Occupancy": rng.choice(occupancy, n),
+        "ICU Occupancy": rng.choice(occupancy, n),
+        "State": rng.choice(["NY", "CA", "TX"], n),
+        "Latitude": 38 + rng.random(n) * 4,
+        "Longitude": -110 + rng.random(n) * 20,
+    })
+
+
+# County lookup
+
+def square(x0, y0, x1, y1):
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+
+
+COUNTY_FEATURES = [
+    ("36001", "Polygon", [square(0, 0, 4, 4), square(1, 1, 3, 3)]), # square with a hole
+    ("36003", "Polygon", [square(1.5, 1.5, 2.5, 2.5)]), # inside the hole
+    ("36005", "MultiPolygon", [[square(5, 0, 6, 1)], [square(5, 3, 6.5, 4.2)]]),
+    ("36007", "Polygon", [[[7, 0], [9, 0], [8, 3], [7, 0]]]),
+]
+
+
+def point_in_rings(x, y, rings):
+    inside = False
+    for ring in rings:
+        for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+            if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                inside = not inside
+    return inside
+
+
+def reference_county(x, y):
+    for geoid, kind, coordinates in COUNTY_FEATURES:
+        polygons = coordinates if kind == "MultiPolygon" else [coordinates]
+        if point_in_rings(x, y, [ring for polygon in polygons for ring in polygon]):
+            return int(geoid)
+    return -1
+
+
+@pytest.fixture
+def county_data(tmp_path):
+    features = [{"type": "Feature", "properties": {"GEOID": geoid},
+                 "geometry": {"type": kind, "coordinates": coordinates}}
+                for geoid, kind, coordinates in COUNTY_FEATURES]
+    path = tmp_path / "counties.json"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    return pa.load_county_polygons(path, cell_size=0.7)
+
+
+@pytest.mark.parametrize("max_edges", [1, 7, 2_000_000])
+def test_get_county_batch_matches_brute_force(county_data, max_edges):
+    rng = np.random.default_rng(1)
+    longitudes = rng.uniform(-1, 10, 2000)
+    latitudes = rng.uniform(-1, 5, 2000)
+    longitudes[:3] = [2, 0.5, np.nan] # inside the hole, in the ring, unlocated
+    latitudes[:3] = [2, 0.5, 1.0]
+
+    counties = pa.get_county_batch(county_data, latitudes, longitudes, max_edges=max_edges)
+
+    expected = [-1 if np.isnan(x) else reference_county(x, y) for x, y in zip(longitudes, latitudes)]
+    assert counties.tolist() == expected
+    assert counties[:3].tolist() == [36003, 36001, -1]
+    assert {36001, 36003, 36005, 36007, -1} <= set(counties.tolist())
+
+
+def test_get_county_with_coordinates(county_data):
+    assert pa.get_county(county_data, (3.8, 5.5)) == 36005
+    assert pa.get_county(county_data, (10, 10)) == -1
+
+
+# SVI thresholds
+
+def test_county_svi_thresholds_match_scoreatpercentile(svi_data):
+    thresholds = pa.county_svi_thresholds(svi_data)
+    for county, threshold in zip(svi_data['counties'], thresholds):
+        svis = svi_data['svi'][svi_data['fips'] // 1_000_000 == county]
+        svis = svis[~np.isnan(svis)]
+        if len(svis):
+            assert threshold == pytest.approx(stats.scoreatpercentile(svis, 75))
+        else:
+            assert threshold == np.inf
+    assert np.isinf(thresholds).sum() == 1
+
+
+def test_regional_flags_follow_counties_list(svi_data, monkeypatch):
+    monkeypatch.setattr(pa, "SVI_COMPARISON", "region")
+    monkeypatch.setattr(pa, "COUNTIES_LIST", [36001, 36003])
+    regional_svis = pa.get_regional_svis(svi_data, [36001, 36003])
+    threshold = stats.scoreatpercentile(regional_svis[~np.isnan(regional_svis)], 75)
+    with np.errstate(invalid='ignore'):
+        assert np.array_equal(pa.svi_extrema_flags(svi_data), svi_data['svi'] >= threshold)
+
+
+# Radius queries
+
+def test_batch_radius_queries_match_single_queries(svi_data):
+    rng = np.random.default_rng(2)
+    latitudes = 38 + rng.random(200) * 4
+    longitudes = -110 + rng.random(200) * 20
+    latitudes[[0, 5]] = np.nan
+    latitudes[100:150], longitudes[100:150] = latitudes[:50], longitudes[:50]
+
+    for _ in range(2): # the second batch is served from the neighborhood cache
+        tracts = pa.get_multi_radius_tracts_batch(svi_data, latitudes, longitudes, (5, 25, 60))
+        for radius, (offsets, tract_indices) in tracts.items():
+            for i in range(len(latitudes)):
+                assert np.array_equal(tract_indices[offsets[i]:offsets[i + 1]],
+                                      pa.query_radius_tracts(svi_data, latitudes[i], longitudes[i], radius))
+
+
+# Priority queues
+
+def test_priority_index_matches_reference():
+    rng = np.random.default_rng(3)
+    index = pa.PriorityIndex()
+    reference = {} # request_id -> (score, insertion order)
+    count = 0
+    for _ in range(3000):
+        operation = rng.random()
+        request_id = int(rng.integers(0, 60))
+        score = int(rng.integers(0, 10))
+        if operation < 0.5:
+            if request_id in reference:
+                reference[request_id] = (score, reference[request_id][1])
+            else:
+                reference[request_id] = (score, count)
+                count += 1
+            index.insert(request_id, score)
+        elif operation < 0.7 and request_id in reference:
+            assert index.remove(request_id) == reference.pop(request_id)[0]
+        elif operation < 0.9 and reference:
+            best = min(reference, key=lambda key: (-reference[key][0], reference[key][1]))
+            assert index.pop() == (best, reference.pop(best)[0])
+        assert len(index) == len(reference)
+        for key, (key_score, _) in reference.items():
+            assert key in index and index.score(key) == key_score
+
+
+def test_top_k_ranks_nan_lowest():
+    assert pa.top_k([3, np.nan, 1, 2], 2).tolist() == [0, 3]
+    rng = np.random.default_rng(4)
+    for _ in range(100):
+        priority = rng.integers(0, 5, 40).astype(float)
+        priority[rng.random(40) < 0.3] = np.nan
+        k = int(rng.integers(0, 45))
+        heap = pa.StreamingTopK(k)
+        heap.extend(range(40), priority)
+        assert [request_id for request_id, _ in heap.items()] == pa.top_k(priority, k).tolist()
+
+
+# Facility taxonomy
+
+def test_set_taxonomy_renumbers_taxonomy_built_without_previous():
+    synonyms = {"widget": ["widget thing"], **pa.FACILITY_TYPE_SYNONYMS}
+    changed = pa.set_taxonomy(pa.FacilityTaxonomy(synonyms, pa.VULN_FACILITIES, pa.GROUP_1_FACILITIES,
+                                                  pa.GROUP_2_FACILITEIS))
+    taxonomy = pa.get_taxonomy()
+    assert [code for code, bit in taxonomy.bits.items() if bit & changed] == ["widget"]
+    assert pa.parse_facility_type("fqhc, widget thing") == taxonomy.bits["fqhc"] | taxonomy.bits["widget"]
+
+
+def test_set_taxonomy_renumbers_afresh_when_bits_run_out():
+    for i in range(100):
+        synonyms = {"new%d" % i: [], **pa.FACILITY_TYPE_SYNONYMS}
+        changed = pa.set_taxonomy(pa.FacilityTaxonomy(synonyms, pa.VULN_FACILITIES, pa.GROUP_1_FACILITIES,
+                                                      pa.GROUP_2_FACILITEIS))
+        taxonomy = pa.get_taxonomy()
+        if changed != -1:
+            assert [code for code, bit in taxonomy.bits.items() if bit & changed] == ["new%d" % i]
+        assert taxonomy._next_bit <= pa.FacilityTaxonomy.MAX_FACILITY_TYPES
+
+
+# Parallel scoring
+
+def test_score_parallel_under_spawn_matches_serial(svi_data, tmp_path, monkeypatch):
+    config = {"facility_types": {"widget": ["widget"], **pa.FACILITY_TYPE_SYNONYMS},
+              "vuln_facilities": ["ach", "widget", "gh"], "group_1_facilities": ["ach"],
+              "group_2_facilities": ["gh"]}
+    (tmp_path / "taxonomy.json").write_text(json.dumps(config))
+    pa.reload_taxonomy(tmp_path / "taxonomy.json")
+    monkeypatch.setattr(pa, "SVI_COMPARISON", "region")
+    monkeypatch.setattr(pa, "COUNTIES_LIST", [36001, 36003, 6013])
+    monkeypatch.setattr(pa, "RADIUS", 40)
+    monkeypatch.setattr(pa, "VULN_WEIGHT", 3)
+    monkeypatch.setattr(pa, "ProcessPoolExecutor", functools.partial(
+        pa.ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")))
+
+    dat = make_requests(600)
+    dat.loc[3, "Latitude"] = np.nan
+    serial = pa.score_requests(dat, pa.score_svi_counts(dat, svi_data))
+    parallel, ranking = pa.score_parallel(dat, svi_data, max_workers=2)
+
+    assert np.array_equal(parallel, serial)
+    assert serial["vuln"].max() > 0
+    assert np.array_equal(ranking, np.argsort(-serial["priority"], kind="stable"))
+
+
+# Geocoding
+
+def test_facility_addresses_formats_missing_and_float_zips():
+    dat = pd.DataFrame({"Street": pd.array(["1 Main St", None], dtype="string"), "City": ["Cambridge", "X"],
+                        "State": ["MA", "M|A"], "Zip": [2138, np.nan]})
+    addresses = pa.facility_addresses(dat)
+    assert addresses == [("1 Main St", "Cambridge", "MA", "2138"), ("", "X", "M|A", "")]
+    assert pa.normalize_address(addresses[0])[3] == "02138"